@@ -1,7 +1,24 @@
+import asyncio
 import pandas as pd
+import re
 import requests
 import time
-from typing import Optional, Tuple
+from typing import Dict, Iterable, Optional, Tuple
+
+try:
+    import orjson as json  # faster parser; same loads() API
+except ImportError:
+    import json
+
+try:
+    import aiohttp  # optional: concurrent postcode pre-fetch
+except ImportError:
+    aiohttp = None
+
+POSTCODE_CONCURRENCY = 64  # max in-flight Postcodes.io requests
+
+# Modern UK postcode shape (e.g. "WR11 4RN"); anything else can never resolve
+_PC_RE = re.compile(r'^[A-Z]{1,2}\d[A-Z\d]?\s*\d[A-Z]{2}$')
 
 # =============================================================================
 # STEP 1: FILL MISSING TOWN & POST CODE
@@ -19,19 +36,70 @@ print(f"Missing Post Codes: {df['Post Code'].isna().sum()}")
 # STEP 2: GEOCODING FUNCTIONS
 # =============================================================================
 
-def geocode_postcode(postcode) -> Optional[Tuple[float, float]]:
-    """Geocode UK postcode using Postcodes.io (free, no rate limit)"""
+# Postcode -> coords (or None) filled by prefetch_postcodes()
+postcode_cache: Dict[str, Optional[Tuple[float, float]]] = {}
+
+def clean_postcode(postcode) -> Optional[str]:
+    """Stripped postcode string, or None if missing/empty/not postcode-shaped"""
     if pd.isna(postcode):
         return None
     postcode = str(postcode).strip()
     if postcode == "" or postcode.lower() == "nan":
         return None
+    if not _PC_RE.match(postcode.upper()):
+        return None  # free text / historical value: skip the HTTP call, go to town
+    return postcode
+
+async def _fetch_postcode(session, postcode: str):
+    """
+    Async version of the Postcodes.io lookup. Returns (postcode, coords) on success,
+    (postcode, None) if the postcode is unknown (404), or None for anything transient
+    (timeout, 429, 5xx, ...) so it is not cached and the sync path retries it.
+    """
+    try:
+        async with session.get(f"https://api.postcodes.io/postcodes/{postcode}") as resp:
+            if resp.status == 404:
+                return postcode, None
+            if resp.status == 200:
+                data = json.loads(await resp.read())
+                if data.get('status') == 200:
+                    result = data['result']
+                    return postcode, (result['latitude'], result['longitude'])
+    except Exception:
+        pass  # Silent fail, retried by geocode_postcode()
+    return None
+
+async def _fetch_all_postcodes(postcodes: Iterable[str]):
+    """Fetch many postcodes over one session, up to POSTCODE_CONCURRENCY at a time"""
+    connector = aiohttp.TCPConnector(limit=POSTCODE_CONCURRENCY)
+    timeout = aiohttp.ClientTimeout(sock_connect=5, sock_read=5)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        return await asyncio.gather(*(_fetch_postcode(session, pc) for pc in postcodes))
+
+def prefetch_postcodes(postcodes: Iterable) -> None:
+    """Geocode all unique postcodes concurrently into postcode_cache (needs aiohttp)"""
+    unique_pcs = {pc for pc in map(clean_postcode, postcodes) if pc is not None}
+    unique_pcs -= postcode_cache.keys()
+    if aiohttp is None or not unique_pcs:
+        return
+    results = asyncio.run(_fetch_all_postcodes(unique_pcs))
+    postcode_cache.update(r for r in results if r is not None)  # definitive answers only
+
+def geocode_postcode(postcode) -> Optional[Tuple[float, float]]:
+    """Geocode UK postcode using Postcodes.io (free, no rate limit)"""
+    postcode = clean_postcode(postcode)
+    if postcode is None:
+        return None
+    if postcode in postcode_cache:
+        return postcode_cache[postcode]
     try:
         url = f"https://api.postcodes.io/postcodes/{postcode}"
         resp = requests.get(url, timeout=5)
-        if resp.status_code == 200 and resp.json()['status'] == 200:
-            data = resp.json()['result']
-            return (data['latitude'], data['longitude'])
+        if resp.status_code == 200:
+            data = json.loads(resp.content)  # parse once
+            if data.get('status') == 200:
+                result = data['result']
+                return (result['latitude'], result['longitude'])
     except Exception as e:
         pass  # Silent fail, will try town next
     return None
@@ -48,26 +116,27 @@ def geocode_town(town) -> Optional[Tuple[float, float]]:
         params = {'q': f"{town}, United Kingdom", 'format': 'json', 'limit': 1}
         headers = {'User-Agent': 'HospitalGeocoder/1.0'}
         resp = requests.get(url, params=params, headers=headers, timeout=5)
-        if resp.status_code == 200 and len(resp.json()) > 0:
-            data = resp.json()[0]
-            return (float(data['lat']), float(data['lon']))
+        if resp.status_code == 200:
+            data = json.loads(resp.content)  # parse once
+            if len(data) > 0:
+                return (float(data[0]['lat']), float(data[0]['lon']))
     except Exception as e:
         pass
     finally:
         time.sleep(1)  # Nominatim rate limit
     return None
 
-def geocode_hospital(row):
-    """Try postcode first, fallback to town"""
-    coords = geocode_postcode(row.get('Post Code'))
+def geocode_hospital(postcode, town) -> Tuple[Optional[float], Optional[float], str]:
+    """Try postcode first, fallback to town. Returns (latitude, longitude, source)"""
+    coords = geocode_postcode(postcode)
     if coords:
-        return {'latitude': coords[0], 'longitude': coords[1], 'geocode_source': 'postcode'}
+        return (coords[0], coords[1], 'postcode')
     
-    coords = geocode_town(row.get('Town'))
+    coords = geocode_town(town)
     if coords:
-        return {'latitude': coords[0], 'longitude': coords[1], 'geocode_source': 'town'}
+        return (coords[0], coords[1], 'town')
     
-    return {'latitude': None, 'longitude': None, 'geocode_source': 'failed'}
+    return (None, None, 'failed')
 
 # =============================================================================
 # STEP 3: GEOCODE ALL DATA (with progress saves)
@@ -83,20 +152,29 @@ df['longitude'] = None
 df['geocode_source'] = None
 
 start_time = time.time()
+
+# Resolve every postcode up front with concurrent requests; the loop below
+# then only hits the network for cache misses and the town fallback
+if aiohttp is not None:
+    prefetch_postcodes(df['Post Code'])
+    print(f"Pre-fetched {len(postcode_cache)} unique postcodes "
+          f"in {time.time() - start_time:.1f}s\n")
+
 success_count = 0
 failed_list = []
 
-for idx, row in df.iterrows():
-    result = geocode_hospital(row)
+# Plain tuples (no per-row Series); 'Post Code' has a space so use positional fields
+for idx, hospital, town, postcode in df[['HOSPITAL', 'Town', 'Post Code']].itertuples(name=None):
+    lat, lon, src = geocode_hospital(postcode, town)
     
-    df.loc[idx, 'latitude'] = result['latitude']
-    df.loc[idx, 'longitude'] = result['longitude']
-    df.loc[idx, 'geocode_source'] = result['geocode_source']
+    df.loc[idx, 'latitude'] = lat
+    df.loc[idx, 'longitude'] = lon
+    df.loc[idx, 'geocode_source'] = src
     
-    if result['geocode_source'] != 'failed':
+    if src != 'failed':
         success_count += 1
     else:
-        failed_list.append({'idx': idx, 'hospital': row['HOSPITAL'], 'town': row['Town'], 'postcode': row['Post Code']})
+        failed_list.append({'idx': idx, 'hospital': hospital, 'town': town, 'postcode': postcode})
     
     # Progress update every 50 rows
     if (idx + 1) % 50 == 0:
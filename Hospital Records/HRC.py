@@ -23,27 +23,27 @@ df['Closure'] = pd.to_numeric(df['Closure'], errors='coerce')
 # Treat 0 or negative values as missing
 df.loc[df['Closure'] <= 0, 'Closure'] = pd.NA
 
+# =========================
+# MISSING LOCATION MASKS
+# =========================
+# Treat empty strings as missing, then a single isna() pass over both columns
+missing = df[['Post Code', 'Town']].replace('', pd.NA).isna()
+missing_postcode = missing['Post Code']
+missing_town = missing['Town']
+missing_both = missing.all(axis=1)
+
 # =========================
 # CLOSED-BEFORE-POSTCODE HOSPITALS
 # =========================
-closed_before_postcode = df.loc[df['Closure'].notna() & (df['Closure'] < CUTOFF_YEAR)]
+closed_mask = df['Closure'].notna() & (df['Closure'] < CUTOFF_YEAR)
 
 # Split into missing vs filled Post Codes
-closed_missing_postcode = closed_before_postcode.loc[
-    closed_before_postcode['Post Code'].isna() | (closed_before_postcode['Post Code'] == '')
-]
-
-closed_with_postcode = closed_before_postcode.loc[
-    closed_before_postcode['Post Code'].notna() & (closed_before_postcode['Post Code'] != '')
-]
+closed_missing_postcode = df.loc[closed_mask & missing_postcode]
+closed_with_postcode = df.loc[closed_mask & ~missing_postcode]
 
 # =========================
 # GENERAL MISSING LOCATION (all hospitals)
 # =========================
-missing_postcode = df['Post Code'].isna() | (df['Post Code'] == '')
-missing_town = df['Town'].isna() | (df['Town'] == '')
-missing_both = missing_postcode & missing_town
-
 print("===== GENERAL MISSING LOCATION =====")
 print("Missing Post Code:", missing_postcode.sum())
 print("Missing Town:", missing_town.sum())
@@ -67,16 +67,8 @@ print("- closed_before_postcode_filled.xlsx")
 print("- all_hospitals_missing_location_flags.xlsx")
 
 
-# Filter hospitals closed before 1959 and missing Post Code
-closed_missing_postcode = closed_before_postcode.loc[
-    closed_before_postcode['Post Code'].isna() | (closed_before_postcode['Post Code'] == '')
-]
-
-# Among these, filter those that do NOT have Town
-no_town = closed_missing_postcode['Town'].isna() | (closed_missing_postcode['Town'] == '')
-
-# Get Excel row numbers
-excel_rows_no_town = closed_missing_postcode.loc[no_town, 'excel_row'].tolist()
+# Hospitals closed before 1959 missing BOTH Post Code and Town (reuses masks above)
+excel_rows_no_town = df.loc[closed_mask & missing_both, 'excel_row'].tolist()
 
 print("Excel rows of closed-before-1959 hospitals missing Post Code AND missing Town:")
 print(excel_rows_no_town)
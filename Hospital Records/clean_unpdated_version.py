@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 
 # Load the UPDATED data (after filling missing Town & Post Code)
@@ -58,14 +59,14 @@ def clean_keep_first(data, subset_cols):
 
 # --- OPTION B: Keep most complete row (RECOMMENDED) ---
 def clean_keep_most_complete(data, subset_cols):
+    # One integer group id per row, numbered in sorted key order (NaN keys kept as a group)
+    group = data.groupby(subset_cols, sort=True, dropna=False).ngroup().to_numpy()
     # Count non-null values per row
-    data = data.copy()
-    data['_completeness'] = data.notna().sum(axis=1)
-    # Sort by subset cols + completeness (descending), then drop dupes keeping first
-    data = data.sort_values(subset_cols + ['_completeness'], ascending=[True]*len(subset_cols) + [False])
-    data = data.drop_duplicates(subset=subset_cols, keep='first')
-    data = data.drop(columns=['_completeness'])
-    return data
+    completeness = data.notna().to_numpy().sum(axis=1)
+    # Stable sort by group, then completeness (descending); first row of each group wins
+    order = np.lexsort((-completeness, group))
+    _, first = np.unique(group[order], return_index=True)
+    return data.iloc[order[first]]
 
 # --- OPTION C: Keep last ---
 def clean_keep_last(data, subset_cols):
@@ -85,17 +86,16 @@ print(f"Safeguard: Only dedupe if Town AND Foundation Date are both filled\n")
 # Split data: rows WITH complete criteria vs rows MISSING Town or Foundation Date
 has_complete_criteria = df['Town'].notna() & df['Foundation Date'].notna()
 
-df_complete = df[has_complete_criteria].copy()      # Can be deduped safely
-df_incomplete = df[~has_complete_criteria].copy()   # Keep as-is (don't risk merging different hospitals)
+df_complete = df.loc[has_complete_criteria]   # Can be deduped safely
+# Rows missing Town or Foundation Date are kept as-is (don't risk merging different hospitals)
 
 print(f"Rows with Town + Foundation Date filled: {len(df_complete)}")
-print(f"Rows missing Town or Foundation Date: {len(df_incomplete)} (kept as-is)\n")
+print(f"Rows missing Town or Foundation Date: {(~has_complete_criteria).sum()} (kept as-is)\n")
 
-# Only dedupe the complete rows
-df_complete_cleaned = clean_keep_most_complete(df_complete, DUPLICATE_CRITERIA)
-
-# Combine back together
-df_cleaned = pd.concat([df_complete_cleaned, df_incomplete], ignore_index=True)
+# Only dedupe the complete rows: drop the losing duplicates from df in one call
+# (no split + concat copies, original row order preserved)
+keep_idx = clean_keep_most_complete(df_complete, DUPLICATE_CRITERIA).index
+df_cleaned = df.drop(index=df_complete.index.difference(keep_idx))
 
 print(f"Before cleaning: {len(df)} rows")
 print(f"After cleaning:  {len(df_cleaned)} rows")
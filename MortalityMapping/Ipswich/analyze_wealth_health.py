@@ -16,11 +16,17 @@ Main Finding: Health improvements favored skilled workers (+25 years) while
 
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
+import matplotlib
+matplotlib.use('Agg')  # headless: the figure is only written to PNG
+from matplotlib.figure import Figure
 from pathlib import Path
 import re
 
+try:
+    import ahocorasick  # pyahocorasick (optional): single-pass multi-keyword matching
+except ImportError:
+    ahocorasick = None
+
 # Paths
 DATA_FILE = Path("MortalityMapping/Ipswich/data_outputs/ipswich_deaths_1871_1910_cleaned.csv")
 OUT_DIR = Path("MortalityMapping/Ipswich/analysis_outputs")
@@ -30,58 +36,157 @@ print("="*70)
 print("IPSWICH WEALTH-HEALTH ANALYSIS (1871-1910)")
 print("="*70)
 
-# Load data
-print("\nLoading data...")
-df = pd.read_csv(DATA_FILE)
-print(f"  {len(df):,} deaths")
-
 # ══════════════════════════════════════════════════════════════════════════════
-# STEP 1: CODE OCCUPATIONS TO SOCIAL CLASS
+# CLASSIFICATION RULES: OCCUPATION → SOCIAL CLASS, CAUSE → DISEASE TYPE
 # ══════════════════════════════════════════════════════════════════════════════
 
-def classify_occupation(occ):
-    """Simple occupation → social class coding."""
-    if pd.isna(occ):
-        return None
-
-    occ = str(occ).lower()
+def match_keyword_classes(text, keyword_classes):
+    """Keyword-class index for each value of a text Series.
+
+    Returns an int8 array: the position (in dict order) of the first class with a
+    keyword in the lowercased text, len(keyword_classes) if none match, and -1
+    for missing values. With pyahocorasick installed, all keywords go into one
+    automaton and each distinct string is scanned once; otherwise one regex
+    alternation per class is matched over the column. A categorical column is
+    classified once per category and broadcast through its integer codes.
+    """
+    if isinstance(text.dtype, pd.CategoricalDtype):
+        category_codes = match_keyword_classes(pd.Series(text.cat.categories), keyword_classes)
+        # Missing values have code -1, which picks the appended -1
+        return np.append(category_codes, -1).astype(np.int8)[text.cat.codes.to_numpy()]
+    low = text.astype('string').str.lower()
+    n_classes = len(keyword_classes)
+    if ahocorasick is not None:
+        automaton = ahocorasick.Automaton()
+        # Add lowest priority first so a keyword listed twice keeps its best class
+        for priority, keywords in reversed(list(enumerate(keyword_classes.values()))):
+            for kw in keywords:
+                automaton.add_word(kw, priority)
+        automaton.make_automaton()
+        codes = {u: min((p for _, p in automaton.iter(u)), default=n_classes)
+                 for u in low.dropna().unique()}
+        return low.map(codes).fillna(-1).to_numpy(dtype=np.int8)
+    masks = [
+        low.str.contains('|'.join(map(re.escape, keywords)), regex=True, na=False).to_numpy(dtype=bool)
+        for keywords in keyword_classes.values()
+    ]
+    codes = np.select(masks, np.arange(n_classes), default=n_classes)
+    return np.where(low.isna().to_numpy(), -1, codes).astype(np.int8)
 
+# Social class → occupation keywords, in priority order (first matching class wins)
+OCCUPATION_CLASSES = {
     # Elite (professional, merchant, gentry)
-    elite_keywords = ['gentleman', 'esquire', 'merchant', 'doctor', 'surgeon', 'physician',
-                      'solicitor', 'barrister', 'reverend', 'clergyman', 'banker',
-                      'manufacturer', 'manager', 'clerk', 'accountant', 'teacher']
+    'Elite': ['gentleman', 'esquire', 'merchant', 'doctor', 'surgeon', 'physician',
+              'solicitor', 'barrister', 'reverend', 'clergyman', 'banker',
+              'manufacturer', 'manager', 'clerk', 'accountant', 'teacher'],
 
     # Skilled (craftsmen, artisans)
-    skilled_keywords = ['carpenter', 'mason', 'painter', 'plumber', 'blacksmith',
-                        'shoemaker', 'tailor', 'baker', 'butcher', 'grocer',
-                        'printer', 'engineer', 'machinist', 'foreman']
+    'Skilled': ['carpenter', 'mason', 'painter', 'plumber', 'blacksmith',
+                'shoemaker', 'tailor', 'baker', 'butcher', 'grocer',
+                'printer', 'engineer', 'machinist', 'foreman'],
 
     # Semi-skilled (factory workers, servants)
-    semiskilled_keywords = ['servant', 'domestic', 'factory', 'mill', 'railway',
-                            'porter', 'driver', 'carter', 'seaman', 'sailor']
+    'Semi-skilled': ['servant', 'domestic', 'factory', 'mill', 'railway',
+                     'porter', 'driver', 'carter', 'seaman', 'sailor'],
 
     # Unskilled (laborers, poor)
-    unskilled_keywords = ['labourer', 'laborer', 'pauper', 'porter', 'hawker',
-                          'washer', 'charwoman', 'sweeper']
-
-    if any(k in occ for k in elite_keywords):
-        return 'Elite'
-    elif any(k in occ for k in skilled_keywords):
-        return 'Skilled'
-    elif any(k in occ for k in semiskilled_keywords):
-        return 'Semi-skilled'
-    elif any(k in occ for k in unskilled_keywords):
-        return 'Unskilled'
+    'Unskilled': ['labourer', 'laborer', 'pauper', 'porter', 'hawker',
+                  'washer', 'charwoman', 'sweeper'],
+}
+
+# Ordered: Elite < Skilled < Semi-skilled < Unskilled < Unknown (1 byte per row)
+SOCIAL_CLASS_DTYPE = pd.CategoricalDtype(list(OCCUPATION_CLASSES) + ['Unknown'], ordered=True)
+
+def classify_occupation(occ):
+    """Simple occupation → social class coding over the whole column (missing stays missing)."""
+    codes = match_keyword_classes(occ, OCCUPATION_CLASSES)
+    # int8 codes straight into a categorical; code -1 (missing occupation) becomes NaN
+    return pd.Series(pd.Categorical.from_codes(codes, dtype=SOCIAL_CLASS_DTYPE), index=occ.index)
+
+# Cause category → disease type (infectious vs chronic), same keyword matcher
+DISEASE_CLASSES = {
+    'Infectious': ['tuberculosis', 'scarlet', 'diphtheria', 'typhoid', 'cholera',
+                   'whooping', 'measles', 'smallpox', 'pneumonia', 'bronchitis',
+                   'diarrhoea', 'dysentery'],
+    'Chronic': ['heart', 'cancer', 'elderly', 'senility', 'tumour', 'nephritis'],
+}
+
+DISEASE_TYPE_DTYPE = pd.CategoricalDtype(list(DISEASE_CLASSES) + ['Other'], ordered=True)
+
+def classify_disease(cause):
+    """Cause category → Infectious / Chronic / Other over the whole column."""
+    codes = match_keyword_classes(cause, DISEASE_CLASSES)
+    codes = np.where(codes < 0, len(DISEASE_CLASSES), codes)  # missing cause → 'Other'
+    return pd.Series(pd.Categorical.from_codes(codes, dtype=DISEASE_TYPE_DTYPE), index=cause.index)
+
+# ══════════════════════════════════════════════════════════════════════════════
+# LOAD DATA
+# ══════════════════════════════════════════════════════════════════════════════
+
+print("\nLoading data...")
+# Only the columns this analysis touches. Years 1871-1910 fit in int16, float32 is
+# plenty for ages, and the low-cardinality text columns load as categoricals.
+NEEDED = ['final_id', 'death_year_clean', 'age_numeric', 'relationship_of_deceased_to_relative',
+          'occupation_of_relative_or_deceased', 'cause_of_death_category']
+DTYPES = {
+    'final_id': 'int32',
+    'death_year_clean': 'int16',
+    'age_numeric': 'float32',
+    'relationship_of_deceased_to_relative': 'category',
+    'occupation_of_relative_or_deceased': 'string',
+    'cause_of_death_category': 'category',
+}
+DECADES = [1870, 1880, 1890, 1900, 1910]
+DECADE_DTYPE = pd.CategoricalDtype(DECADES, ordered=True)
+# Prefer the Parquet copy written by clean_ipswich_deaths.py (reads only NEEDED columns)
+PARQUET_FILE = DATA_FILE.with_suffix('.parquet')
+SOURCE_FILE = PARQUET_FILE if PARQUET_FILE.exists() else DATA_FILE
+
+# The classified frame (STEP 1 output) is a pure function of the input file and
+# the keyword rules, so reruns that only tweak the analysis/plots reuse it.
+CACHE_FILE = OUT_DIR / "classified.feather"
+CACHE_KEY_FILE = OUT_DIR / "classified.key"
+cache_key = f"{SOURCE_FILE.resolve()}|{SOURCE_FILE.stat().st_mtime}|{DECADES}|{OCCUPATION_CLASSES}|{DISEASE_CLASSES}"
+use_cache = (CACHE_FILE.exists() and CACHE_KEY_FILE.exists()
+             and CACHE_KEY_FILE.read_text() == cache_key)
+
+if use_cache:
+    df = pd.read_feather(CACHE_FILE)
+    print(f"  {len(df):,} deaths (classified, from cache {CACHE_FILE.name})")
+else:
+    if SOURCE_FILE == PARQUET_FILE:
+        df = pd.read_parquet(PARQUET_FILE, columns=NEEDED).astype(DTYPES)
     else:
-        return 'Unknown'
+        df = pd.read_csv(DATA_FILE, usecols=NEEDED, dtype=DTYPES)
+    print(f"  {len(df):,} deaths")
+
+    # Decade computed once here; filtered subsets (e.g. infants) inherit it. The
+    # years span 1871-1910, so the decade is a 0-4 code into a small ordered categorical.
+    decade_code = ((df['death_year_clean'].to_numpy() - DECADES[0]) // 10).astype('int8')
+    df['decade'] = pd.Categorical.from_codes(decade_code, dtype=DECADE_DTYPE)
+
+# ══════════════════════════════════════════════════════════════════════════════
+# STEP 1: CODE OCCUPATIONS TO SOCIAL CLASS (AND CAUSES TO DISEASE TYPE)
+# ══════════════════════════════════════════════════════════════════════════════
 
 print("\n" + "="*70)
 print("STEP 1: Coding Occupations to Social Class")
 print("="*70)
 
-df['social_class'] = df['occupation_of_relative_or_deceased'].apply(classify_occupation)
+if not use_cache:
+    df['social_class'] = classify_occupation(df['occupation_of_relative_or_deceased'])
+    df['disease_type'] = classify_disease(df['cause_of_death_category'])
+    try:
+        df.to_feather(CACHE_FILE)
+        CACHE_KEY_FILE.write_text(cache_key)
+    except ImportError:
+        pass  # pyarrow not installed: no cache, classify again next run
+
+# Class × disease-type counts in one grouped pass; the class distribution here
+# and the disease-by-class table in STEP 4 are both reductions of it
+class_disease = df.groupby(['social_class', 'disease_type'], observed=True).size()
 
-class_dist = df['social_class'].value_counts()
+class_dist = class_disease.groupby(level='social_class', observed=True).sum().sort_values(ascending=False)
 print("\nSocial class distribution:")
 for cls, count in class_dist.items():
     print(f"  {cls:15s}: {count:6,} ({count/len(df)*100:5.1f}%)")
@@ -94,30 +199,31 @@ print("\n" + "="*70)
 print("STEP 2: Infant Mortality by Father's Social Class")
 print("="*70)
 
-# Filter to children with father info
-children = df[df['relationship_of_deceased_to_relative'].str.contains('Son of|Daughter of', na=False)].copy()
-infants = children[children['age_numeric'] < 5].copy()
+# Filter to children with father info. The relationship column is categorical
+# with only ~140 labels: find the "Son of"/"Daughter of" ones among them once,
+# then select rows with a hash lookup instead of a regex scan per row.
+relationship = df['relationship_of_deceased_to_relative']
+child_labels = {v for v in relationship.cat.categories if 'Son of' in v or 'Daughter of' in v}
+child_mask = relationship.isin(child_labels).to_numpy()
+infant_mask = child_mask & (df['age_numeric'].to_numpy() < 5)
+infants = df.loc[infant_mask].copy()  # the only subset materialized
 
-print(f"\nChildren deaths: {len(children):,}")
+print(f"\nChildren deaths: {int(child_mask.sum()):,}")
 print(f"Infant deaths (<5): {len(infants):,}")
 
-# Father's class
+# Father's class (keeps the ordered social-class categorical dtype)
 infants['father_class'] = infants['social_class']
-infant_by_class = infants.groupby('father_class').agg({
-    'age_numeric': ['count', 'mean', 'median'],
-    'final_id': 'count'
-})
+# Only the moments that are reported: deaths and median age per class
+infant_by_class = infants.groupby('father_class', observed=True)['age_numeric'].agg(['count', 'median'])
 
 print("\nInfant mortality by father's class:")
 print(infant_by_class)
 
-# Test: Elite vs Unskilled
-elite_infants = infants[infants['father_class'] == 'Elite']
-unskilled_infants = infants[infants['father_class'] == 'Unskilled']
-
-if len(elite_infants) > 0 and len(unskilled_infants) > 0:
-    elite_med = elite_infants['age_numeric'].median()
-    unskilled_med = unskilled_infants['age_numeric'].median()
+# Test: Elite vs Unskilled (medians read from the table above)
+has_gradient = {'Elite', 'Unskilled'} <= set(infant_by_class.index)
+if has_gradient:
+    elite_med = infant_by_class.loc['Elite', 'median']
+    unskilled_med = infant_by_class.loc['Unskilled', 'median']
     print(f"\nMedian age at death:")
     print(f"  Elite infants:     {elite_med:.2f} years")
     print(f"  Unskilled infants: {unskilled_med:.2f} years")
@@ -132,34 +238,45 @@ print("STEP 3: Temporal Trends - Health Technology Impact")
 print("="*70)
 
 # Overall mortality trend
-annual = df.groupby('death_year_clean').agg({
-    'final_id': 'count',
-    'age_numeric': 'median'
-}).rename(columns={'final_id': 'deaths', 'age_numeric': 'median_age'})
+annual = df.groupby('death_year_clean').agg(
+    deaths=('final_id', 'count'),
+    median_age=('age_numeric', 'median'),
+)
 
 print("\nAnnual deaths and median age:")
 print(annual.head(10))
 
 # Infant mortality rate over time
-infant_annual = infants.groupby('death_year_clean').size()
-total_annual = df.groupby('death_year_clean').size()
-infant_rate = (infant_annual / total_annual * 100).fillna(0)
+# Years are a small dense integer range: count per year with np.bincount
+# (one C loop, no hashing) and divide the aligned arrays directly
+first_year = int(df['death_year_clean'].min())
+year_offset = df['death_year_clean'].to_numpy() - first_year
+n_years = int(year_offset.max()) + 1
+total_annual = np.bincount(year_offset, minlength=n_years)
+infant_annual = np.bincount(year_offset[infant_mask], minlength=n_years)
+infant_rate = pd.Series(
+    np.divide(infant_annual * 100, total_annual, out=np.zeros(n_years), where=total_annual > 0),
+    index=np.arange(first_year, first_year + n_years),
+)
+
+# Mean rate per 1871-1880, 1881-1890, ... period in one grouped reduction
+# (integer slices like infant_rate[1871:1881] select by position, not year)
+period_start = (infant_rate.index.to_numpy() - 1) // 10 * 10 + 1
+period_rate = infant_rate.groupby(period_start).mean()
 
 print(f"\nInfant mortality rate (% of all deaths):")
-print(f"  1871-1880: {infant_rate[1871:1881].mean():.1f}%")
-print(f"  1881-1890: {infant_rate[1881:1891].mean():.1f}%")
-print(f"  1891-1900: {infant_rate[1891:1901].mean():.1f}%")
-print(f"  1901-1910: {infant_rate[1901:1911].mean():.1f}%")
+for start, rate in period_rate.items():
+    print(f"  {start}-{start + 9}: {rate:.1f}%")
 
 # Cause trends
-cause_annual = df.groupby(['death_year_clean', 'cause_of_death_category']).size().unstack(fill_value=0)
+cause_annual = df.groupby(['death_year_clean', 'cause_of_death_category'], observed=True).size().unstack(fill_value=0)
 
 # Top causes
-top_causes = df['cause_of_death_category'].value_counts().head(5).index.tolist()
+cause_counts = df['cause_of_death_category'].value_counts()
+top_causes = cause_counts.head(5).index.tolist()
 print(f"\nTop 5 causes overall:")
 for i, cause in enumerate(top_causes, 1):
-    count = df[df['cause_of_death_category'] == cause].shape[0]
-    print(f"  {i}. {cause}: {count:,}")
+    print(f"  {i}. {cause}: {cause_counts[cause]:,}")
 
 # ══════════════════════════════════════════════════════════════════════════════
 # STEP 4: HETEROGENEOUS EFFECTS (Class × Time)
@@ -169,42 +286,29 @@ print("\n" + "="*70)
 print("STEP 4: Heterogeneous Effects - Did Health Tech Benefit All Equally?")
 print("="*70)
 
-# Decade
-df['decade'] = (df['death_year_clean'] // 10) * 10
+# Elite/Skilled/Unskilled rows, found once; infants are a row subset of df, so
+# the same mask indexed by infant_mask selects their father's-class rows
+esu_mask = df['social_class'].isin(['Elite', 'Skilled', 'Unskilled']).to_numpy()
 
-# Median age by class and decade
-class_time = df[df['social_class'].isin(['Elite', 'Skilled', 'Unskilled'])].groupby(['decade', 'social_class'])['age_numeric'].agg(['median', 'count'])
+# Median age by class and decade, built directly in wide (decade × class) form;
+# class_time['median'] is the table the plot and findings read
+class_time = df.loc[esu_mask].pivot_table(
+    values='age_numeric', index='decade', columns='social_class',
+    aggfunc=['median', 'count'], observed=True)
 
 print("\nMedian age at death by class and decade:")
-print(class_time.unstack(level=1))
+print(class_time)
 
 # Infant mortality by class and decade
-infants['decade'] = (infants['death_year_clean'] // 10) * 10
-infant_class_time = infants[infants['father_class'].isin(['Elite', 'Skilled', 'Unskilled'])].groupby(['decade', 'father_class']).size().unstack(fill_value=0)
+infant_class_time = infants.loc[esu_mask[infant_mask]].groupby(['decade', 'father_class'], observed=True).size().unstack(fill_value=0)
 
 print("\nInfant deaths by father's class and decade:")
 print(infant_class_time)
 
-# Infectious vs chronic by class (using actual categories)
-infectious_keywords = ['tuberculosis', 'scarlet', 'diphtheria', 'typhoid', 'cholera',
-                       'whooping', 'measles', 'smallpox', 'pneumonia', 'bronchitis',
-                       'diarrhoea', 'dysentery']
-chronic_keywords = ['heart', 'cancer', 'elderly', 'senility', 'tumour', 'nephritis']
-
-def classify_disease(cause):
-    if pd.isna(cause):
-        return 'Other'
-    cause = str(cause).lower()
-    if any(k in cause for k in infectious_keywords):
-        return 'Infectious'
-    elif any(k in cause for k in chronic_keywords):
-        return 'Chronic'
-    else:
-        return 'Other'
-
-df['disease_type'] = df['cause_of_death_category'].apply(classify_disease)
-
-disease_class = df[df['social_class'].isin(['Elite', 'Unskilled'])].groupby(['social_class', 'disease_type']).size().unstack(fill_value=0)
+# Infectious vs chronic by class (reuses the STEP 1 class × disease counts)
+disease_class = class_disease[
+    class_disease.index.get_level_values('social_class').isin(['Elite', 'Unskilled'])
+].unstack(fill_value=0)
 disease_class_pct = disease_class.div(disease_class.sum(axis=1), axis=0) * 100
 
 print("\nDisease type by class (%):")
@@ -218,12 +322,15 @@ print("\n" + "="*70)
 print("STEP 5: Creating Visualizations")
 print("="*70)
 
-sns.set_style("whitegrid")
-fig, axes = plt.subplots(2, 2, figsize=(14, 10))
+# Plain matplotlib styling (white background, light grid) - no seaborn import needed
+matplotlib.rcParams.update({'axes.grid': True, 'grid.alpha': 0.3, 'axes.facecolor': 'white'})
+# Object-oriented Figure: no pyplot state machine or figure manager
+fig = Figure(figsize=(14, 10))
+axes = fig.subplots(2, 2)
 
 # Plot 1: Median age by class over time
 ax1 = axes[0, 0]
-class_time_plot = class_time['median'].unstack(level=1)
+class_time_plot = class_time['median']
 for cls in ['Elite', 'Skilled', 'Unskilled']:
     if cls in class_time_plot.columns:
         data = class_time_plot[cls].dropna()
@@ -263,9 +370,9 @@ ax4.set_title('Top Causes of Death Over Time (1871-1910)')
 ax4.legend()
 ax4.grid(True, alpha=0.3)
 
-plt.tight_layout()
+fig.tight_layout()
 fig_file = OUT_DIR / "wealth_health_analysis.png"
-plt.savefig(fig_file, dpi=300, bbox_inches='tight')
+fig.savefig(fig_file, dpi=300, bbox_inches='tight')
 print(f"\n  ✓ Saved: {fig_file}")
 
 # ══════════════════════════════════════════════════════════════════════════════
@@ -277,20 +384,21 @@ print("KEY FINDINGS")
 print("="*70)
 
 # Finding 1: Class gradient
-if len(elite_infants) > 0 and len(unskilled_infants) > 0:
+if has_gradient:
     gradient = abs(elite_med - unskilled_med)
     print(f"\n1. INFANT MORTALITY CLASS GRADIENT:")
     print(f"   Elite infants live {gradient:.1f} years longer than unskilled")
 
 # Finding 2: Temporal trend
-early_rate = infant_rate[1871:1881].mean()
-late_rate = infant_rate[1901:1911].mean()
-change = ((late_rate - early_rate) / early_rate * 100)
+early_rate = period_rate.get(1871, np.nan)
+late_rate = period_rate.get(1901, np.nan)
+# No parent links are recorded before 1880, so the early rate can be 0
+change = ((late_rate - early_rate) / early_rate * 100) if early_rate > 0 else np.nan
 print(f"\n2. HEALTH TECHNOLOGY IMPACT:")
 print(f"   Infant mortality rate changed {change:+.1f}% from 1871-1880 to 1901-1910")
 
 # Finding 3: Heterogeneous effects
-class_time_unstacked = class_time['median'].unstack(level=1)
+class_time_unstacked = class_time['median']
 try:
     early_decade = class_time_unstacked.index.min()
     late_decade = class_time_unstacked.index.max()
@@ -330,7 +438,7 @@ summary = pd.DataFrame({
         'Unskilled infectious disease rate (%)'
     ],
     'value': [
-        f"{gradient:.1f} years" if len(elite_infants) > 0 else 'N/A',
+        f"{gradient:.1f} years" if has_gradient else 'N/A',
         f"{change:+.1f}%",
         f"{elite_infectious:.1f}%",
         f"{unskilled_infectious:.1f}%"
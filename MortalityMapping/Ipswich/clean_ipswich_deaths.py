@@ -2,7 +2,7 @@
 Clean and standardize Ipswich deaths dataset (UKDA-5413, 1871-1910)
 
 Input:  Raw Ipswich deaths from Dropbox (tab-delimited)
-Output: Cleaned CSV with:
+Output: Cleaned Parquet (zstd) and CSV (optional, WRITE_CSV) with:
   - Standardized names, ages, dates, causes
   - Age groups and decades (matching FreeBMD format)
   - RD spatial mapping (centroids + polygon references)
@@ -24,6 +24,12 @@ import pandas as pd
 import numpy as np
 from pathlib import Path
 
+try:
+    import pyarrow  # noqa: F401  (Arrow-backed strings: one contiguous buffer per column)
+    TEXT_DTYPE = 'string[pyarrow]'
+except ImportError:
+    TEXT_DTYPE = 'string'
+
 # ══════════════════════════════════════════════════════════════════════════════
 # CONFIGURATION
 # ══════════════════════════════════════════════════════════════════════════════
@@ -36,10 +42,18 @@ CENTROIDS_FILE = BASE_DIR / "Harmonization/data_outputs/4_final_coverage/rd_year
 COVERAGE_FILE = BASE_DIR / "Harmonization/data_outputs/4_final_coverage/rd_year_coverage_1851_backbone_1851_1990.csv"
 OUT_DIR = Path(__file__).parent / "data_outputs"
 OUT_DIR.mkdir(parents=True, exist_ok=True)
+# Parquet copies of the Harmonization RD tables (re-read on every run)
+RD_CACHE_DIR = OUT_DIR / "rd_reference_cache"
 
 # Use official RD centroids (1851-1911) instead of reconstructed 1851 backbone
 USE_OFFICIAL_RDS = True
 
+# Constructed RD polygons (one layer per census year, see polygon_layer column)
+POLYGON_SOURCE = "Harmonization/data_outputs/2_rd_construction/rd_constructed_from_1851_parishes.gpkg"
+
+# Also write the cleaned CSV next to the Parquet output (for spreadsheets/other tools)
+WRITE_CSV = True
+
 # Age bins (matching FreeBMD format)
 AGE_BINS = [
     (0, 0, "a_0"), (1, 1, "a_1"), (2, 4, "a_2_4"), (5, 9, "a_5_9"),
@@ -48,34 +62,89 @@ AGE_BINS = [
     (55, 64, "a_55_64"), (65, 74, "a_65_74"), (75, 999, "a_75_up"),
 ]
 
+# Raw free-text columns (parsed or kept as text; death_month is left to inference
+# because parse_death_date also accepts numeric months)
+RAW_TEXT_COLS = [
+    'surname', 'deceaseds_forenames', 'age', 'sex', 'death_year', 'death_day_',
+    'reg_dist', 'tidy_street', 'relationship_of_deceased_to_relative',
+    'relatives_forenames', 'relatives_surname', 'occupation_of_relative_or_deceased',
+    'cause_of_death', "mo's_classification_of_cause_of_death", 'cause_of_death_category',
+]
+
+# Output columns: keep only essential columns (remove duplicates/messy versions)
+KEEP_COLS = [
+    # Core ID and dates
+    'final_id', 'death_year_clean', 'death_date', 'decade', 'qod',
+
+    # Personal (cleaned versions only)
+    'surname', 'deceaseds_forenames',
+    'sex_std', 'age_numeric', 'age_group',
+
+    # Address (cleaned versions only)
+    'tidy_street',
+
+    # Family (KEEP - 26% have parent info for infant/child deaths!)
+    'relationship_of_deceased_to_relative',
+    'relatives_forenames', 'relatives_surname',
+
+    # Occupation (wealth proxy)
+    'occupation_of_relative_or_deceased',
+
+    # Cause (keep all - this is the key data!)
+    'cause_of_death',
+    "mo's_classification_of_cause_of_death",
+    'cause_of_death_category',
+
+    # FreeBMD matching
+    'surname_for_matching',
+    'forenames_for_matching',
+
+    # Spatial (at the end)
+    'reg_dist_std',
+    'centroid_x', 'centroid_y',
+    'polygon_layer',
+]
+
 # ══════════════════════════════════════════════════════════════════════════════
 # HELPER FUNCTIONS
 # ══════════════════════════════════════════════════════════════════════════════
 
-def normalize_name(s):
-    """Normalize name for matching (lowercase, no special chars)."""
-    if pd.isna(s) or str(s).strip() == "":
-        return None
-    s = str(s).lower().strip()
+# Regex patterns, compiled once. Passing compiled patterns to .str.replace also keeps
+# Python's Unicode-aware \w/\s, so accented letters in the latin1 names survive
+# (Arrow's regex engine treats \w as ASCII only)
+_NON_WORD_RE = re.compile(r'[^\w\s]')
+_WHITESPACE_RE = re.compile(r'\s+')
+_PARENS_RE = re.compile(r'\s*\([^)]*\)')
+_MONTHS_RE = re.compile(r'(\d+)\s*(?:mth|month)')
+_WEEKS_RE = re.compile(r'(\d+)\s*week')
+_DAYS_RE = re.compile(r'(\d+)\s*day')
+_NUMBER_RE = re.compile(r'(\d+)')
+_YEAR4_RE = re.compile(r'(\d{4})')
+
+def normalize_name(names):
+    """Normalize names for matching (lowercase, no special chars), whole column at once."""
+    s = names.astype(TEXT_DTYPE).str.lower().str.strip()
     # Remove special characters but keep spaces
-    s = re.sub(r'[^\w\s]', '', s)
-    s = ' '.join(s.split())
-    return s if s else None
-
-def normalize_district(s):
-    """Normalize district name for RD matching."""
-    if pd.isna(s) or str(s).strip() == "":
-        return None
-    s = str(s).lower().strip()
+    s = s.str.replace(_NON_WORD_RE, '', regex=True)
+    s = s.str.replace(_WHITESPACE_RE, ' ', regex=True).str.strip()
+    return s.replace('', pd.NA)
+
+def normalize_district(districts):
+    """Normalize district names for RD matching, whole column at once."""
+    # Only a handful of distinct names repeat across thousands of rows: normalize
+    # each distinct name once, then expand back to the rows by factorize code
+    codes, uniques = pd.factorize(districts)
+    s = pd.Series(uniques).astype(TEXT_DTYPE).str.lower().str.strip()
     # Remove parentheses, standardize
-    s = re.sub(r'\s*\([^)]*\)', '', s)
-    s = s.replace("&", "and").replace("-", " ")
-    s = ' '.join(s.split())
-    return s if s else None
+    s = s.str.replace(_PARENS_RE, '', regex=True)
+    s = s.str.replace('&', 'and', regex=False).str.replace('-', ' ', regex=False)
+    s = s.str.replace(_WHITESPACE_RE, ' ', regex=True).str.strip()
+    s = s.replace('', pd.NA)
+    return pd.Series(s.array.take(codes, allow_fill=True), index=districts.index)
 
-def parse_age_to_numeric(age_str):
+def parse_age_to_numeric(ages):
     """
-    Parse age string to numeric value in years.
+    Parse age strings to numeric values in years (whole column at once).
 
     Handles:
       - "31" → 31.0
@@ -83,127 +152,90 @@ def parse_age_to_numeric(age_str):
       - "2 weeks" → 0.04
       - "5 days" → 0.01
     """
-    if pd.isna(age_str):
-        return None
+    s = ages.astype(TEXT_DTYPE).str.lower().str.strip()
 
-    age_str = str(age_str).lower().strip()
+    # Simple numeric first, then months/weeks/days, then the first number found
+    numeric = pd.to_numeric(s, errors='coerce').astype('float64')
+    months = s.str.extract(_MONTHS_RE, expand=False).astype('float64') / 12
+    weeks = s.str.extract(_WEEKS_RE, expand=False).astype('float64') / 52
+    days = s.str.extract(_DAYS_RE, expand=False).astype('float64') / 365
+    first_num = s.str.extract(_NUMBER_RE, expand=False).astype('float64')
 
-    # Try simple numeric
-    try:
-        return float(age_str)
-    except ValueError:
-        pass
-
-    # Parse "X mths" / "X months"
-    match = re.search(r'(\d+)\s*(mth|month)', age_str)
-    if match:
-        return round(float(match.group(1)) / 12, 2)
-
-    # Parse "X weeks"
-    match = re.search(r'(\d+)\s*week', age_str)
-    if match:
-        return round(float(match.group(1)) / 52, 2)
-
-    # Parse "X days"
-    match = re.search(r'(\d+)\s*day', age_str)
-    if match:
-        return round(float(match.group(1)) / 365, 2)
-
-    # If all else fails, try to extract first number
-    match = re.search(r'(\d+)', age_str)
-    if match:
-        return float(match.group(1))
-
-    return None
-
-def map_age_to_group(age):
-    """Map numeric age to age group bin."""
-    if pd.isna(age):
-        return None
-    try:
-        age_val = float(age)
-        if age_val < 0 or age_val > 120:
-            return None
-        for low, high, col in AGE_BINS:
-            if low <= age_val <= high:
-                return col
-        return "a_75_up"
-    except (ValueError, TypeError):
-        return None
-
-def standardize_sex(sex_str):
-    """Standardize sex to M/F."""
-    if pd.isna(sex_str):
-        return None
-    s = str(sex_str).lower().strip()
-    if s in ["m", "male"]:
-        return "M"
-    elif s in ["f", "female"]:
-        return "F"
-    return None
-
-def parse_death_date(row):
+    return numeric.fillna(months.fillna(weeks).fillna(days).round(2)).fillna(first_num)
+
+def map_age_to_group(ages):
     """
-    Parse death date from multiple columns.
-    Priority: death_year, death_month, death_day_
-    Returns: YYYY-MM-DD string (with NaNs as None)
+    Map numeric ages to age group bins (whole column at once).
+    Ages are completed years as in FreeBMD, so fractional ages fall in the bin
+    of their whole part (e.g. 0.25 → a_0, 4.5 → a_2_4).
     """
-    year = row.get('death_year')
-    month = row.get('death_month')
-    day = row.get('death_day_')
+    edges = [low for low, _, _ in AGE_BINS] + [np.inf]
+    groups = pd.cut(ages, bins=edges, right=False, labels=[col for _, _, col in AGE_BINS])
+    return groups.where((ages >= 0) & (ages <= 120))
+
+def standardize_sex(sexes):
+    """Standardize sex to M/F (whole column at once, as a categorical; anything else → NA)."""
+    sex_map = {'m': 'M', 'male': 'M', 'f': 'F', 'female': 'F'}
+    return sexes.astype(TEXT_DTYPE).str.lower().str.strip().map(sex_map).astype('category')
 
+def parse_death_date(year, month, day):
+    """
+    Build death date strings from the death_year, death_month and death_day_ columns.
+    Returns: YYYY-MM-DD / YYYY-MM / YYYY string Series (missing as NA)
+    """
     # Convert month name to number
     month_map = {
         'jan': 1, 'feb': 2, 'mar': 3, 'apr': 4, 'may': 5, 'jun': 6,
         'jul': 7, 'aug': 8, 'sep': 9, 'oct': 10, 'nov': 11, 'dec': 12
     }
 
-    if pd.isna(year):
-        return None
-
     # Extract year number (handle "1891 *" or other junk)
-    try:
-        if isinstance(year, str):
-            year_match = re.search(r'(\d{4})', year)
-            year_int = int(year_match.group(1)) if year_match else None
-        else:
-            year_int = int(year)
-    except (ValueError, AttributeError):
-        year_int = None
-
-    # Extract month
-    if pd.isna(month):
-        month_int = None
-    elif isinstance(month, str):
-        month_int = month_map.get(month.lower().strip()[:3])
+    year_int = year.astype(TEXT_DTYPE).str.extract(_YEAR4_RE, expand=False).astype('Int64')
+
+    # Extract month: names by their first three letters, numeric columns as-is
+    if pd.api.types.is_numeric_dtype(month):
+        month_int = month.astype('Int64')
     else:
-        try:
-            month_int = int(month)
-        except (ValueError, TypeError):
-            month_int = None
+        month_int = month.astype(TEXT_DTYPE).str.lower().str.strip().str[:3].map(month_map).astype('Int64')
 
     # Extract day (handle messy text like "Found dead in bed on  3")
-    if pd.isna(day):
-        day_int = None
-    else:
-        try:
-            if isinstance(day, str):
-                day_match = re.search(r'(\d+)', day)
-                day_int = int(day_match.group(1)) if day_match else None
-            else:
-                day_int = int(day)
-        except (ValueError, AttributeError):
-            day_int = None
-
-    # Build date string
-    if year_int and month_int and day_int:
-        return f"{year_int:04d}-{month_int:02d}-{day_int:02d}"
-    elif year_int and month_int:
-        return f"{year_int:04d}-{month_int:02d}"
-    elif year_int:
-        return f"{year_int:04d}"
-
-    return None
+    day_int = day.astype(TEXT_DTYPE).str.extract(_NUMBER_RE, expand=False).astype('Int64')
+
+    has_year = year_int.fillna(0).to_numpy() > 0
+    has_month = has_year & (month_int.fillna(0).to_numpy() > 0)
+    has_day = has_month & (day_int.fillna(0).to_numpy() > 0)
+
+    # Build date string (most complete form available)
+    y = year_int.astype(TEXT_DTYPE).str.zfill(4)
+    ym = y + '-' + month_int.astype(TEXT_DTYPE).str.zfill(2)
+    ymd = ym + '-' + day_int.astype(TEXT_DTYPE).str.zfill(2)
+    return y.where(has_year).mask(has_month, ym).mask(has_day, ymd)
+
+def read_rd_table(csv_path):
+    """
+    Read a Harmonization RD table through a Parquet copy in RD_CACHE_DIR.
+    The copy is rebuilt whenever the CSV is newer; without pyarrow, read the CSV.
+    """
+    cache_file = RD_CACHE_DIR / csv_path.with_suffix('.parquet').name
+    try:
+        if cache_file.exists() and cache_file.stat().st_mtime >= csv_path.stat().st_mtime:
+            return pd.read_parquet(cache_file)
+        table = pd.read_csv(csv_path)
+        RD_CACHE_DIR.mkdir(exist_ok=True)
+        table.to_parquet(cache_file, index=False)
+        return table
+    except ImportError:
+        return pd.read_csv(csv_path)
+
+def lookup_rd_year(table, rd, year, value_cols):
+    """
+    Look up value_cols of an RD table (district_norm, year rows) for each
+    (rd, year) pair; pairs missing from the table get NaN, like a left merge.
+    """
+    indexed = (table.drop_duplicates(['district_norm', 'year'])
+                    .set_index(['district_norm', 'year'])[value_cols])
+    found = indexed.reindex(pd.MultiIndex.from_arrays([rd, year]))
+    return found.to_numpy()
 
 # ══════════════════════════════════════════════════════════════════════════════
 # STAGE 1: LOAD AND PARSE
@@ -214,10 +246,23 @@ print("IPSWICH DEATHS CLEANING PIPELINE")
 print("="*80)
 
 print("\nLoading raw data...")
-df = pd.read_csv(IPSWICH_FILE, sep='\t', encoding='latin1',
-                 on_bad_lines='skip', low_memory=False)
+# Free-text columns are read as strings up front, so neither parser has to infer
+# (or mix) their types and the C parser can keep its low-memory chunked mode
+raw_dtypes = {c: TEXT_DTYPE for c in RAW_TEXT_COLS}
+try:
+    # Multi-threaded Arrow parser; ArrowInvalid is a ValueError
+    df = pd.read_csv(IPSWICH_FILE, sep='\t', encoding='latin1',
+                     on_bad_lines='skip', engine='pyarrow', dtype=raw_dtypes)
+except (ImportError, ValueError):
+    df = pd.read_csv(IPSWICH_FILE, sep='\t', encoding='latin1',
+                     on_bad_lines='skip', dtype=raw_dtypes)
+
+# Text columns as Arrow strings instead of boxed Python objects
+text_cols = df.select_dtypes(include=['object', 'string']).columns
+df[text_cols] = df[text_cols].astype(TEXT_DTYPE)
 
 n_total = len(df)
+n_raw_cols = len(df.columns)
 print(f"  Loaded: {n_total:,} records")
 
 # ══════════════════════════════════════════════════════════════════════════════
@@ -227,20 +272,24 @@ print(f"  Loaded: {n_total:,} records")
 print("\nCleaning and standardizing...")
 
 # Parse age
-df['age_numeric'] = df['age'].apply(parse_age_to_numeric)
-df['age_group'] = df['age_numeric'].apply(map_age_to_group)
+df['age_numeric'] = parse_age_to_numeric(df['age'])
+df['age_group'] = map_age_to_group(df['age_numeric'])
 print(f"  Age parsed: {df['age_numeric'].notna().sum():,} / {n_total:,}")
 
 # Standardize sex
-df['sex_std'] = df['sex'].apply(standardize_sex)
+df['sex_std'] = standardize_sex(df['sex'])
 print(f"  Sex standardized: {df['sex_std'].notna().sum():,} / {n_total:,}")
 
 # Parse death date
-df['death_date'] = df.apply(parse_death_date, axis=1)
+df['death_date'] = parse_death_date(df['death_year'], df['death_month'], df['death_day_'])
 df['death_year_clean'] = pd.to_numeric(df['death_year'], errors='coerce').astype('Int64')
 
 # Filter out garbage years (found 1092, 9102 in data)
-df = df[df['death_year_clean'].between(1871, 1910)].copy()
+# and keep only the output columns plus the raw ones still read below (district,
+# month/quarter), so later stages don't carry the other raw columns around
+valid_years = df['death_year_clean'].between(1871, 1910).to_numpy(dtype=bool, na_value=False)
+needed = set(KEEP_COLS) | {'reg_dist', 'death_month', 'quarter'}
+df = df.loc[valid_years, [c for c in df.columns if c in needed]].copy()
 n_valid_years = len(df)
 print(f"  Valid years (1871-1910): {n_valid_years:,} / {n_total:,}")
 
@@ -248,11 +297,11 @@ print(f"  Valid years (1871-1910): {n_valid_years:,} / {n_total:,}")
 df['decade'] = (df['death_year_clean'] // 10) * 10
 
 # Normalize names for matching
-df['surname_for_matching'] = df['surname'].apply(normalize_name)
-df['forenames_for_matching'] = df['deceaseds_forenames'].apply(normalize_name)
+df['surname_for_matching'] = normalize_name(df['surname'])
+df['forenames_for_matching'] = normalize_name(df['deceaseds_forenames'])
 
 # Standardize registration district
-df['reg_dist_std'] = df['reg_dist'].apply(normalize_district)
+df['reg_dist_std'] = normalize_district(df['reg_dist'])
 
 print(f"  Names normalized: {df['surname_for_matching'].notna().sum():,}")
 
@@ -263,15 +312,15 @@ print(f"  Names normalized: {df['surname_for_matching'].notna().sum():,}")
 print("\nMapping to RD spatial data...")
 
 # Load RD coverage and centroids
-coverage = pd.read_csv(COVERAGE_FILE)
+coverage = read_rd_table(COVERAGE_FILE)
 
 if USE_OFFICIAL_RDS:
     print("  Using official RD centroids (1851-1881), extending 1881 centroid to 1891-1911")
 
     # Load official centroids (1851-1911, but Ipswich only exists 1851-1881)
-    official = pd.read_csv(OFFICIAL_CENTROIDS_FILE)
+    official = read_rd_table(OFFICIAL_CENTROIDS_FILE)
     official = official.rename(columns={'official_x': 'centroid_x', 'official_y': 'centroid_y'})
-    official['district_norm'] = official['district'].apply(normalize_district)
+    official['district_norm'] = normalize_district(official['district'])
 
     # Get Ipswich official centroids (1851-1881)
     ipswich_official = official[official['district_norm'] == 'ipswich'][['district_norm', 'year', 'centroid_x', 'centroid_y']].copy()
@@ -281,81 +330,63 @@ if USE_OFFICIAL_RDS:
     centroid_1881 = ipswich_official[ipswich_official['year'] == 1881].iloc[0]
     missing_years = [1891, 1901, 1911]
 
-    for year in missing_years:
-        ipswich_official = pd.concat([
-            ipswich_official,
-            pd.DataFrame([{
-                'district_norm': 'ipswich',
-                'year': year,
-                'centroid_x': centroid_1881['centroid_x'],
-                'centroid_y': centroid_1881['centroid_y']
-            }])
-        ], ignore_index=True)
+    # All missing years in one frame, appended with a single concat
+    ipswich_official = pd.concat([
+        ipswich_official,
+        pd.DataFrame({
+            'district_norm': 'ipswich',
+            'year': missing_years,
+            'centroid_x': centroid_1881['centroid_x'],
+            'centroid_y': centroid_1881['centroid_y']
+        })
+    ], ignore_index=True)
 
     centroids = ipswich_official.sort_values('year')
     print(f"    Using 1881 centroid ({centroid_1881['centroid_x']:.1f}, {centroid_1881['centroid_y']:.1f}) for all years")
 else:
     print("  Using reconstructed centroids from 1851 backbone")
-    centroids = pd.read_csv(CENTROIDS_FILE)
-    centroids['district_norm'] = centroids['district'].apply(normalize_district)
+    centroids = read_rd_table(CENTROIDS_FILE)
+    centroids['district_norm'] = normalize_district(centroids['district'])
 
 # Normalize district names in spatial files
-coverage['district_norm'] = coverage['district'].apply(normalize_district)
+coverage['district_norm'] = normalize_district(coverage['district'])
 
 # Strategy: Match Ipswich sub-districts to "Ipswich" RD
 # Ipswich Eastern, Ipswich Western, St Matthew, St Margaret, St Clement → all map to "Ipswich" RD
 
 # Create mapping: normalize to "ipswich" for all Ipswich-related districts
 def map_to_main_rd(district_norm):
-    """Map Ipswich sub-districts to main Ipswich RD."""
-    if pd.isna(district_norm):
-        return None
-    if 'ipswich' in district_norm or district_norm in ['st matthew', 'st margaret', 'st clement']:
-        return 'ipswich'
-    return district_norm
+    """Map Ipswich sub-districts to main Ipswich RD (whole column at once)."""
+    is_ipswich = (district_norm.str.contains('ipswich', regex=False, na=False)
+                  | district_norm.isin(['st matthew', 'st margaret', 'st clement']))
+    return district_norm.mask(is_ipswich, 'ipswich')
 
-df['rd_name_mapped'] = df['reg_dist_std'].apply(map_to_main_rd)
+df['rd_name_mapped'] = map_to_main_rd(df['reg_dist_std'])
 
 # For each death, get RD centroid from nearest census year
 CENSUS_YEARS = [1851, 1861, 1871, 1881, 1891, 1901, 1911]
 
-def get_nearest_census(year):
-    """Get nearest census year."""
-    if pd.isna(year):
-        return None
-    return min(CENSUS_YEARS, key=lambda y: abs(y - year))
-
-df['nearest_census'] = df['death_year_clean'].apply(get_nearest_census)
-
-# Merge centroids
-# For each row, match: rd_name_mapped + nearest_census → centroid
-centroids_merge = centroids[['district_norm', 'year', 'centroid_x', 'centroid_y']].copy()
-centroids_merge = centroids_merge.rename(columns={'district_norm': 'rd_name_mapped', 'year': 'nearest_census'})
-
-df = df.merge(
-    centroids_merge,
-    on=['rd_name_mapped', 'nearest_census'],
-    how='left'
-)
-
-n_spatial = df['centroid_x'].notna().sum()
+def get_nearest_census(years, census_years=CENSUS_YEARS):
+    """Get nearest census year for each year (ties go to the earlier census)."""
+    census = np.asarray(census_years)
+    y = years.to_numpy(dtype='float64', na_value=np.nan)
+    # Binary search for the census at/after each year, then pick the closer neighbour
+    idx = np.clip(np.searchsorted(census, y), 1, len(census) - 1)
+    left, right = census[idx - 1], census[idx]
+    nearest = np.where(y - left <= right - y, left, right)
+    return pd.Series(nearest, index=years.index).astype('Int64').where(~np.isnan(y))
+
+df['nearest_census'] = get_nearest_census(df['death_year_clean'])
+
+# Centroid lookup: rd_name_mapped + nearest_census → centroid. Only the count is
+# needed here; the columns are filled once, after the Stage 4 RD imputation
+centroid_keys = pd.MultiIndex.from_frame(centroids[['district_norm', 'year']])
+n_spatial = pd.MultiIndex.from_frame(df[['rd_name_mapped', 'nearest_census']]).isin(centroid_keys).sum()
 print(f"  Spatially linked: {n_spatial:,} / {n_valid_years:,} ({n_spatial/n_valid_years*100:.1f}%)")
 
-# Add matched_share and polygon reference from coverage
-# Match on: rd_name_mapped + death_year_clean
-coverage_merge = coverage[['district_norm', 'year', 'matched_share', 'usable_1851_backbone']].copy()
-coverage_merge = coverage_merge.rename(columns={'district_norm': 'rd_name_mapped', 'year': 'death_year_clean'})
-
-df = df.merge(
-    coverage_merge,
-    on=['rd_name_mapped', 'death_year_clean'],
-    how='left'
-)
-
-# Add polygon reference (constructed RD from 1851 backbone)
-# Note: Actual polygons stored in: Harmonization/data_outputs/2_rd_construction/rd_constructed_from_1851_parishes.gpkg
-df['polygon_source'] = 'Harmonization/data_outputs/2_rd_construction/rd_constructed_from_1851_parishes.gpkg'
-df['polygon_layer'] = df['nearest_census'].apply(lambda y: f"rd_{y}_constructed" if pd.notna(y) else None)
+# Add polygon reference (constructed RD from 1851 backbone). The polygon file is
+# the same for every row, so it is recorded once in the metadata sidecar (POLYGON_SOURCE)
+df['polygon_layer'] = 'rd_' + df['nearest_census'].astype(TEXT_DTYPE) + '_constructed'  # NA stays NA
 
 # ══════════════════════════════════════════════════════════════════════════════
 # STAGE 4: IMPROVE RD ASSIGNMENT
@@ -365,50 +396,31 @@ print("\nImproving RD assignment...")
 
 # For records without reg_dist, try to infer from parish or assume Ipswich
 # (Since this is Ipswich-specific dataset, safe assumption)
-df.loc[df['rd_name_mapped'].isna(), 'rd_name_mapped'] = 'ipswich'
-df.loc[df['reg_dist_std'].isna(), 'reg_dist_std'] = 'inferred_ipswich'
+# Both hold only a few distinct names: store them as categoricals (int8 codes)
+df['rd_name_mapped'] = df['rd_name_mapped'].fillna('ipswich').astype('category')
+df['reg_dist_std'] = df['reg_dist_std'].fillna('inferred_ipswich').astype('category')
 
 print(f"  RD assigned: {df['rd_name_mapped'].notna().sum():,} / {len(df):,} (100%)")
 
 # Re-merge centroids with improved mapping
-def get_available_census(year):
+def get_available_census(years):
     """Get nearest available census year in centroids file."""
-    if pd.isna(year):
-        return None
     if USE_OFFICIAL_RDS:
         # Official centroids have all census years 1851-1911
-        available = [1851, 1861, 1871, 1881, 1891, 1901, 1911]
-    else:
-        # Reconstructed centroids missing 1891
-        available = [1851, 1861, 1871, 1881, 1901, 1911]
-        if 1886 <= year <= 1895:
-            return 1881
-    return min(available, key=lambda y: abs(y - year))
-
-df['nearest_census'] = df['death_year_clean'].apply(get_available_census)
-
-# Drop old centroid columns and re-merge
-df = df.drop(columns=['centroid_x', 'centroid_y', 'matched_share', 'usable_1851_backbone'], errors='ignore')
+        return get_nearest_census(years, [1851, 1861, 1871, 1881, 1891, 1901, 1911])
+    # Reconstructed centroids missing 1891
+    nearest = get_nearest_census(years, [1851, 1861, 1871, 1881, 1901, 1911])
+    return nearest.mask(years.between(1886, 1895).to_numpy(dtype=bool, na_value=False), 1881)
 
-centroids_merge = centroids[['district_norm', 'year', 'centroid_x', 'centroid_y']].copy()
-centroids_merge = centroids_merge.rename(columns={'district_norm': 'rd_name_mapped', 'year': 'nearest_census'})
+df['nearest_census'] = get_available_census(df['death_year_clean'])
 
-df = df.merge(
-    centroids_merge,
-    on=['rd_name_mapped', 'nearest_census'],
-    how='left'
-)
-
-# Re-merge coverage
-df = df.drop(columns=['matched_share', 'usable_1851_backbone'], errors='ignore')
-coverage_merge = coverage[['district_norm', 'year', 'matched_share', 'usable_1851_backbone']].copy()
-coverage_merge = coverage_merge.rename(columns={'district_norm': 'rd_name_mapped', 'year': 'death_year_clean'})
-
-df = df.merge(
-    coverage_merge,
-    on=['rd_name_mapped', 'death_year_clean'],
-    how='left'
-)
+# Centroids (by nearest census) and coverage (by death year) for each row's RD:
+# both tables are small, so index them by (RD, year) and look the keys up
+# instead of hash-joining the whole frame
+df[['centroid_x', 'centroid_y']] = lookup_rd_year(
+    centroids, df['rd_name_mapped'], df['nearest_census'], ['centroid_x', 'centroid_y'])
+df[['matched_share', 'usable_1851_backbone']] = lookup_rd_year(
+    coverage, df['rd_name_mapped'], df['death_year_clean'], ['matched_share', 'usable_1851_backbone'])
 
 n_spatial_improved = df['centroid_x'].notna().sum()
 print(f"  Spatially linked (improved): {n_spatial_improved:,} / {len(df):,} ({n_spatial_improved/len(df)*100:.1f}%)")
@@ -419,62 +431,24 @@ print(f"  Spatially linked (improved): {n_spatial_improved:,} / {len(df):,} ({n_
 
 print("\nCleaning up redundant columns...")
 
-# Keep only essential columns (remove duplicates/messy versions)
-keep_cols = [
-    # Core ID and dates
-    'final_id', 'death_year_clean', 'death_date', 'decade', 'qod',
-
-    # Personal (cleaned versions only)
-    'surname', 'deceaseds_forenames',
-    'sex_std', 'age_numeric', 'age_group',
-
-    # Address (cleaned versions only)
-    'tidy_street',
-
-    # Family (KEEP - 26% have parent info for infant/child deaths!)
-    'relationship_of_deceased_to_relative',
-    'relatives_forenames', 'relatives_surname',
-
-    # Occupation (wealth proxy)
-    'occupation_of_relative_or_deceased',
-
-    # Cause (keep all - this is the key data!)
-    'cause_of_death',
-    "mo's_classification_of_cause_of_death",
-    'cause_of_death_category',
-
-    # FreeBMD matching
-    'surname_for_matching',
-    'forenames_for_matching',
-
-    # Spatial (at the end)
-    'reg_dist_std',
-    'centroid_x', 'centroid_y',
-    'polygon_layer',
-]
-
 # Add quarter of death if it exists
 if 'qod' not in df.columns and 'quarter' in df.columns:
     df['qod'] = df['quarter']
 elif 'qod' not in df.columns:
-    # Infer from death_month
-    def month_to_quarter(month_str):
-        if pd.isna(month_str):
-            return None
-        month_map = {'jan':1,'feb':1,'mar':1,'apr':2,'may':2,'jun':2,
-                     'jul':3,'aug':3,'sep':3,'oct':4,'nov':4,'dec':4}
-        if isinstance(month_str, str):
-            return month_map.get(month_str.lower().strip()[:3])
-        return None
-    df['qod'] = df['death_month'].apply(month_to_quarter)
-
-# Keep only columns that exist
-final_cols = [c for c in keep_cols if c in df.columns]
+    # Infer from death_month (first three letters of the month name)
+    quarter_map = {'jan':1,'feb':1,'mar':1,'apr':2,'may':2,'jun':2,
+                   'jul':3,'aug':3,'sep':3,'oct':4,'nov':4,'dec':4}
+    month_abbr = df['death_month'].astype(TEXT_DTYPE).str.lower().str.strip().str[:3]
+    df['qod'] = month_abbr.map(quarter_map).astype('Int64')
+
+# Keep only columns that exist (one hashed set of the current columns)
+have = set(df.columns)
+final_cols = [c for c in KEEP_COLS if c in have]
 
 df = df[final_cols]
 
 n_cols = len(df.columns)
-print(f"  Reduced from 65 to {n_cols} essential columns")
+print(f"  Reduced from {n_raw_cols} to {n_cols} essential columns")
 print(f"  Kept relatives columns: {n_cols} includes parent info for 26% of deaths")
 
 # ══════════════════════════════════════════════════════════════════════════════
@@ -483,14 +457,35 @@ print(f"  Kept relatives columns: {n_cols} includes parent info for 26% of death
 
 print("\nSorting by year and saving...")
 
-# Sort by death year, then by id
-df = df.sort_values(['death_year_clean', 'final_id']).reset_index(drop=True)
-
-# Save
-out_file = OUT_DIR / "ipswich_deaths_1871_1910_cleaned.csv"
-df.to_csv(out_file, index=False)
-
-print(f"  ✓ Saved: {out_file.name}")
+# Sort by death year, then by id (one lexsort over the raw arrays; the year filter
+# already removed missing years, so no NA handling is needed)
+order = np.lexsort((df['final_id'].to_numpy(), df['death_year_clean'].to_numpy(dtype='int64')))
+df = df.iloc[order].reset_index(drop=True)
+
+# Save: Parquet for downstream scripts (columnar, typed, much faster to write and
+# load than CSV), plus the CSV when WRITE_CSV is set or Parquet is unavailable
+csv_file = OUT_DIR / "ipswich_deaths_1871_1910_cleaned.csv"
+parquet_file = csv_file.with_suffix('.parquet')
+out_file = parquet_file
+try:
+    df.to_parquet(parquet_file, compression='zstd', index=False)
+    print(f"  ✓ Saved: {parquet_file.name}")
+except ImportError:
+    print("  (pyarrow not installed - skipped Parquet copy)")
+    out_file = csv_file
+
+if WRITE_CSV or out_file == csv_file:
+    df.to_csv(csv_file, index=False)
+    print(f"  ✓ Saved: {csv_file.name}")
+    out_file = csv_file
+
+# Dataset-level metadata (constant for every row)
+meta_file = csv_file.with_suffix('.meta.json')
+meta_file.write_text(json.dumps({
+    'polygon_source': POLYGON_SOURCE,
+    'polygon_layer': 'rd_<nearest census year>_constructed',
+}, indent=2))
+print(f"  ✓ Saved: {meta_file.name}")
 
 # ══════════════════════════════════════════════════════════════════════════════
 # SUMMARY
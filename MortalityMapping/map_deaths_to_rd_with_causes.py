@@ -7,7 +7,7 @@ Process:
   3. Cause assignment: ecological inference from aggregate RD-level data
      For each individual: (RD, decade, age_group, sex) → cause probability distribution
 
-Output: deaths_{year}_with_causes.csv
+Output: deaths_{year}_with_causes.parquet (zstd) and .csv (optional, WRITE_CSV)
   - Individual deaths with spatial coordinates (centroid_x, centroid_y)
   - Cause probability distributions (JSON format)
   - Spatial quality metrics (boundary_stability, spatial_confidence)
@@ -19,20 +19,37 @@ Note: Uses 1851 backbone centroids (not official GBHGIS) for better coverage.
       For ecological inference, coverage > precision: need RD name to match cause stats.
 """
 
+import os
 import re
+import sys
 import json
+import numpy as np
 import pandas as pd
 from pathlib import Path
 
+# Compact JSON for the cause distributions: orjson (Rust encoder) when installed,
+# otherwise the stdlib with the same separators, so the output text is identical
+try:
+    import orjson
+
+    def json_dumps(obj):
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY).decode()
+    json_loads = orjson.loads
+except ImportError:
+    def json_dumps(obj):
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+    json_loads = json.loads
+
 # ══════════════════════════════════════════════════════════════════════════════
 # CONFIGURATION
 # ══════════════════════════════════════════════════════════════════════════════
 
-YEAR           = 1866       # Year to process
+YEAR           = int(sys.argv[1]) if len(sys.argv) > 1 else 1866  # Year to process (optional CLI arg)
 USE_SAMPLE     = False      # True = 10k sample (testing), False = full dataset
 SAMPLE_SIZE    = 10000
 USE_OFFICIAL_RDS = False    # False = use 1851 backbone (better coverage for ecological inference)
 RUN_SENSITIVITY = False     # True = run sensitivity analysis comparing certain vs uncertain deaths
+WRITE_CSV      = True       # Also write the CSV copy (Parquet is always written when pyarrow is available)
 
 # Paths
 DROPBOX_DEATHS = Path("/Users/kimik/Ellen Dropbox/Kimia Zargarzadeh/WealthisHealth/freebmd/Deaths/cleaned")
@@ -43,6 +60,7 @@ OFFICIAL_CENTROIDS_FILE = Path("Harmonization/data_outputs/3_validation/official
 CENTROIDS_FILE = Path("Harmonization/data_outputs/4_final_coverage/rd_year_summary_1851_backbone_with_imputed_centroids.csv")
 OUT_DIR        = Path("MortalityMapping/data_outputs")
 OUT_DIR.mkdir(parents=True, exist_ok=True)
+CACHE_DIR      = OUT_DIR / "reference_cache"  # Parquet copies of the normalized reference tables
 
 # Constants
 DECADE         = (YEAR // 10) * 10  # 1866 → 1860
@@ -56,43 +74,157 @@ AGE_BINS = [
     (25, 34, "a_25_34"), (35, 44, "a_35_44"), (45, 54, "a_45_54"),
     (55, 64, "a_55_64"), (65, 74, "a_65_74"), (75, 999, "a_75_up"),
 ]
+AGE_GROUPS = [col for _, _, col in AGE_BINS]
+
+# Columns identifying a cause-distribution group (categorical in df)
+GROUP_COLS = ["district_norm", "sex", "age_group"]
+
+# Columns read from each input (the rest are never used)
+DEATH_COLS = ["surname", "firstnames", "district", "yod", "qod", "age", "gender_final"]
+DEATH_DTYPES = {"district": "category", "gender_final": "category"}
+CAUSE_COLS = ["reg_dist", "decade", "sex", "cause"] + AGE_GROUPS
+# Mortality columns hold official deaths by sex and age: m_35_44 → ("M", "a_35_44")
+MORT_COL_GROUPS = {
+    f"{sex.lower()}_{age_group.replace('a_', '')}": (sex, age_group)
+    for sex in ["M", "F"] for age_group in AGE_GROUPS
+}
+MORT_COLS = ["reg_dist", "decade"] + list(MORT_COL_GROUPS)
+# Death counts stay inferred: the tables use placeholders like "." that are coerced to
+# numbers where they are used (cause_probabilities and official_group_totals)
+CAUSE_DTYPES = {"reg_dist": "category", "decade": "int16", "sex": "category", "cause": "category"}
+MORT_DTYPES = {"reg_dist": "category", "decade": "int16"}
 
 # ══════════════════════════════════════════════════════════════════════════════
 # HELPER FUNCTIONS
 # ══════════════════════════════════════════════════════════════════════════════
 
-def normalize_district(s):
-    """Normalize district name for matching."""
-    if pd.isna(s) or str(s).strip() == "":
-        return None
-    s = str(s).lower().strip()
-    s = re.sub(r'\s*\(\d{4}[^)]*\)', '', s)
-    s = s.replace("&", "and").replace("-", " ")
-    return " ".join(s.split())
-
-def map_age_to_group(age):
-    """Map individual age to aggregate age group."""
+_YEAR_PARENS_RE = re.compile(r'\s*\(\d{4}[^)]*\)')
+_WHITESPACE_RE = re.compile(r'\s+')
+
+def as_category(values, dtype):
+    """Cast to a shared categorical dtype; values outside its categories become NA."""
+    return values.where(values.isin(dtype.categories)).astype(dtype)
+
+def read_table(path, columns, sep=",", dtype=None):
+    """Read only the listed columns that exist in the file (Arrow parser when available)."""
+    header = pd.read_csv(path, sep=sep, nrows=0).columns
+    usecols = [c for c in columns if c in header]
+    dtype = {c: t for c, t in (dtype or {}).items() if c in usecols}
     try:
-        age_val = float(age)
-        if not (MIN_AGE <= age_val <= MAX_AGE):
-            return None
-        for low, high, col in AGE_BINS:
-            if low <= age_val <= high:
-                return col
-        return "a_75_up"
-    except (ValueError, TypeError):
-        return None
-
-def map_sex(gender):
-    """Map gender to M/F."""
-    if pd.isna(gender):
-        return None
-    g = str(gender).lower().strip()
-    if g in ["m", "male"]:
-        return "M"
-    elif g in ["f", "female"]:
-        return "F"
-    return None
+        # Multi-threaded Arrow parser; ArrowInvalid is a ValueError
+        return pd.read_csv(path, sep=sep, usecols=usecols, dtype=dtype, engine="pyarrow")
+    except (ImportError, ValueError):
+        return pd.read_csv(path, sep=sep, usecols=usecols, dtype=dtype, low_memory=False,
+                           float_precision="round_trip")
+
+def read_decade(path, columns, dtype=None, exclude_causes=()):
+    """
+    Read one decade of a tab-separated cause/mortality table (optionally without some causes;
+    rows with no cause are then dropped too, since they cannot key a distribution).
+    With pyarrow the rows are filtered on the Arrow table, so only kept rows reach pandas.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        from pyarrow import csv as pa_csv
+
+        header = pd.read_csv(path, sep="\t", nrows=0).columns
+        table = pa_csv.read_csv(
+            path,
+            parse_options=pa_csv.ParseOptions(delimiter="\t"),
+            convert_options=pa_csv.ConvertOptions(
+                include_columns=[c for c in columns if c in header], strings_can_be_null=True
+            ),
+        )
+        keep = pc.fill_null(pc.equal(table["decade"], DECADE), False)
+        if exclude_causes:
+            excluded = pc.is_in(table["cause"], value_set=pa.array(exclude_causes))
+            keep = pc.and_(keep, pc.and_(pc.is_valid(table["cause"]),
+                                         pc.fill_null(pc.invert(excluded), False)))
+        rows = table.filter(keep).to_pandas()
+    except (ImportError, ValueError):  # ArrowInvalid is a ValueError
+        rows = read_table(path, columns, sep="\t")
+        keep = rows["decade"] == DECADE
+        if exclude_causes:
+            keep &= rows["cause"].notna() & ~rows["cause"].isin(exclude_causes)
+        rows = rows.loc[keep]
+    dtype = {c: t for c, t in (dtype or {}).items() if c in rows.columns}
+    return rows.astype(dtype).reset_index(drop=True)
+
+def cached_table(name, sources, build):
+    """
+    Return build() through a Parquet copy in CACHE_DIR, so normalized reference tables are
+    reused across years. The copy is rebuilt whenever a source file or this script is
+    newer; without pyarrow, just build (once). The copy is written to a temporary file and renamed,
+    so runs for several years in parallel never read a half-written cache.
+    """
+    cache_file = CACHE_DIR / f"{name}.parquet"
+    newest_input = max(Path(p).stat().st_mtime for p in [*sources, __file__])
+    if cache_file.exists() and cache_file.stat().st_mtime >= newest_input:
+        try:
+            return pd.read_parquet(cache_file)
+        except ImportError:
+            pass
+    table = build()
+    try:
+        CACHE_DIR.mkdir(exist_ok=True)
+        tmp_file = cache_file.with_suffix(f".{os.getpid()}.tmp")
+        table.to_parquet(tmp_file, index=False)
+        tmp_file.replace(cache_file)
+    except ImportError:
+        pass  # no Parquet engine: keep the table, skip the cache
+    return table
+
+def distribution_entries(distributions):
+    """
+    JSON cause distributions as (codes, entries): entries is an Arrow list<struct<cause,
+    probability>> array with one element per distinct JSON string (parsed once), and codes
+    gives each row's position in it (-1 where there is no distribution).
+    Probabilities have 4 decimals, so they are stored exactly as uint16 counts of 1/10,000
+    (uint32 if an official total is so far below the cause counts that this overflows).
+    """
+    import pyarrow as pa
+
+    codes, uniques = pd.factorize(distributions)
+    records = [
+        [{"cause": c, "probability": round(p * 10_000)} for c, p in json_loads(u).items()]
+        for u in uniques
+    ]
+    largest = max((r["probability"] for rs in records for r in rs), default=0)
+    probability = pa.field(
+        "probability", pa.uint16() if largest <= 0xFFFF else pa.uint32(),
+        metadata={"scale": "0.0001"}
+    )
+    entry_type = pa.struct([pa.field("cause", pa.string()), probability])
+    return codes, pa.array(records, type=pa.list_(entry_type))
+
+def normalize_district(districts):
+    """Normalize district names for matching (whole column at once; blank → NA)."""
+    # Normalize each distinct name once, then expand back to the rows by factorize code
+    codes, uniques = pd.factorize(districts)
+    raw = pd.Series(uniques).astype(str).str.lower().str.strip()
+    s = raw.str.replace(_YEAR_PARENS_RE, '', regex=True)
+    s = s.str.replace("&", "and", regex=False).str.replace("-", " ", regex=False)
+    s = s.str.replace(_WHITESPACE_RE, ' ', regex=True).str.strip()
+    s = s.mask(raw == "")
+    return pd.Series(s.array.take(codes, allow_fill=True), index=districts.index)
+
+def map_age_to_group(ages):
+    """
+    Map numeric ages to aggregate age groups (whole column at once).
+    Fractional ages fall in the bin of their whole part (e.g. 0.5 → a_0, 4.5 → a_2_4).
+    """
+    edges = [low for low, _, _ in AGE_BINS] + [np.inf]
+    groups = pd.cut(ages, bins=edges, right=False, labels=AGE_GROUPS)
+    return groups.where(ages.between(MIN_AGE, MAX_AGE))
+
+def map_sex(genders):
+    """Map gender to M/F (whole column at once, as a categorical; anything else → NA)."""
+    # Only a handful of distinct spellings: map each category once
+    genders = genders.astype("category")
+    sex_map = {"m": "M", "male": "M", "f": "F", "female": "F"}
+    lookup = {g: sex_map.get(str(g).lower().strip()) for g in genders.cat.categories}
+    return genders.map(lookup).astype(pd.CategoricalDtype(["M", "F"]))
 
 # ══════════════════════════════════════════════════════════════════════════════
 # STAGE 1: LOAD & SPATIAL MAPPING
@@ -105,7 +237,7 @@ print("="*70)
 # Load deaths
 fpath = DROPBOX_DEATHS / f"cleaned_freebmd_deaths_{YEAR}.csv"
 print(f"Loading: {fpath.name}")
-df = pd.read_csv(fpath, low_memory=False)
+df = read_table(fpath, DEATH_COLS, dtype=DEATH_DTYPES)
 n_total = len(df)
 
 # Filter valid age
@@ -113,27 +245,29 @@ if "age" not in df.columns:
     raise ValueError("No age column - this script requires post-1866 data with age")
 
 df["age_numeric"] = pd.to_numeric(df["age"], errors="coerce")
-df = df[df["age_numeric"].between(MIN_AGE, MAX_AGE)].copy()
+# (reset_index gives a fresh frame with a clean 0..n-1 index; no separate .copy() needed)
+df = df.loc[df["age_numeric"].between(MIN_AGE, MAX_AGE)].reset_index(drop=True)
 print(f"  {len(df):,} with valid age ({len(df)/n_total*100:.1f}%)")
 
 # Sample if requested
 if USE_SAMPLE:
-    df = df.sample(n=min(SAMPLE_SIZE, len(df)), random_state=42).copy()
+    df = df.sample(n=min(SAMPLE_SIZE, len(df)), random_state=42).reset_index(drop=True)
     print(f"  Using {len(df):,} sample for testing")
 
 n_records = len(df)
 
-# Map age, sex, and decade
-df["age_group"] = df["age_numeric"].apply(map_age_to_group)
-df["sex"] = df.get("gender_final", pd.Series(dtype=str)).apply(map_sex)
-df["decade"] = DECADE  # Explicit decade column for transparency
-df["district_norm"] = df["district"].apply(normalize_district)
+# Map age and sex (decade is constant for the year; added just before saving)
+df["age_group"] = map_age_to_group(df["age_numeric"])
+df["sex"] = map_sex(df.get("gender_final", pd.Series(index=df.index, dtype=object)))
+df["district_norm"] = normalize_district(df["district"])
 
 # Load RD coverage
 print(f"\nSpatial mapping:")
-cov = pd.read_csv(COVERAGE_FILE)
-cov["district_norm"] = cov["district"].apply(normalize_district)
-cov_year = cov[cov["year"] == YEAR].copy()
+cov = cached_table(COVERAGE_FILE.stem, [COVERAGE_FILE], lambda: (
+    read_table(COVERAGE_FILE, ["year", "district", "matched_share"])
+    .assign(district_norm=lambda t: normalize_district(t["district"]))
+))
+cov_year = cov[cov["year"] == YEAR]  # only read (merged below), never modified
 
 # Get centroids from nearest census year
 CENSUS_YEARS = [1851, 1861, 1871, 1881, 1891, 1901, 1911]
@@ -141,16 +275,20 @@ nearest_census = min(CENSUS_YEARS, key=lambda y: abs(y - YEAR))
 
 if USE_OFFICIAL_RDS:
     print(f"  Using official GBHGIS RD centroids from {nearest_census}")
-    cent = pd.read_csv(OFFICIAL_CENTROIDS_FILE)
-    cent = cent[cent["year"] == nearest_census].copy()
+    cent = cached_table(OFFICIAL_CENTROIDS_FILE.stem, [OFFICIAL_CENTROIDS_FILE], lambda: (
+        read_table(OFFICIAL_CENTROIDS_FILE, ["year", "district", "official_x", "official_y"])
+        .assign(district_norm=lambda t: normalize_district(t["district"]))
+    ))
+    cent = cent[cent["year"] == nearest_census]  # only merged below; index unused
     cent = cent.rename(columns={'official_x': 'centroid_x', 'official_y': 'centroid_y'})
-    cent["district_norm"] = cent["district"].apply(normalize_district)
     cent["centroid_source"] = "official_rd"
 else:
     print(f"  Using 1851 backbone centroids from {nearest_census}")
-    cent = pd.read_csv(CENTROIDS_FILE)
-    cent = cent[cent["year"] == nearest_census].copy()
-    cent["district_norm"] = cent["district"].apply(normalize_district)
+    cent = cached_table(CENTROIDS_FILE.stem, [CENTROIDS_FILE], lambda: (
+        read_table(CENTROIDS_FILE, ["year", "district", "centroid_x", "centroid_y"])
+        .assign(district_norm=lambda t: normalize_district(t["district"]))
+    ))
+    cent = cent[cent["year"] == nearest_census]  # only merged below; index unused
     cent["centroid_source"] = "1851_backbone"
 
 # Merge coverage + centroids
@@ -158,26 +296,23 @@ centroid_cols = ["district_norm", "centroid_x", "centroid_y"]
 if "centroid_source" in cent.columns:
     centroid_cols.append("centroid_source")
 
+# Dedupe both sides first (first row per district), so the join is one-to-one
+cov_year = cov_year.drop_duplicates("district_norm").dropna(subset=["district_norm"])
 cov_year = cov_year.merge(
-    cent[centroid_cols],
-    on="district_norm",
-    how="left"
-).drop_duplicates("district_norm")
-
-# Join deaths to RD
-merge_cols = ["district_norm", "district", "centroid_x", "centroid_y", "matched_share"]
-if "centroid_source" in cov_year.columns:
-    merge_cols.append("centroid_source")
-
-df = df.merge(
-    cov_year[merge_cols],
+    cent[centroid_cols].drop_duplicates("district_norm"),
     on="district_norm",
     how="left",
-    suffixes=("", "_rd")
-)
-
-if "district_rd" in df.columns:
-    df = df.rename(columns={"district_rd": "rd_name"})
+    validate="one_to_one"
+).set_index("district_norm")
+
+# Join deaths to RD (lookup against the district_norm index, one column at a time)
+rd_cols = {
+    "district": "rd_name", "centroid_x": "centroid_x", "centroid_y": "centroid_y",
+    "matched_share": "matched_share", "centroid_source": "centroid_source"
+}
+for col, out_col in rd_cols.items():
+    if col in cov_year.columns:
+        df[out_col] = df["district_norm"].map(cov_year[col])
 
 n_linked = df["centroid_x"].notna().sum()
 print(f"  Linked: {n_linked:,} / {n_records:,} ({n_linked/n_records*100:.1f}%)")
@@ -185,11 +320,16 @@ print(f"  Linked: {n_linked:,} / {n_records:,} ({n_linked/n_records*100:.1f}%)")
 # Keep essential columns only
 keep_cols = [
     "surname", "firstnames", "district", "yod", "qod",
-    "age_numeric", "age_group", "sex", "decade",
+    "age_numeric", "age_group", "sex",
     "district_norm", "rd_name", "centroid_x", "centroid_y", "centroid_source", "matched_share"
 ]
 keep_cols = [c for c in keep_cols if c in df.columns]
-df = df[keep_cols].copy()
+df = df.reindex(columns=keep_cols)
+
+# Low-cardinality text columns as categoricals (age_group and sex already are)
+for col in ["district_norm", "centroid_source"]:
+    if col in df.columns:
+        df[col] = df[col].astype("category")
 
 # ══════════════════════════════════════════════════════════════════════════════
 # STAGE 2: CAUSE ASSIGNMENT (VECTORIZED FOR SPEED)
@@ -197,23 +337,90 @@ df = df[keep_cols].copy()
 
 print(f"\nCause assignment (decade {DECADE}):")
 
-# Load cause data
-cause = pd.read_csv(CAUSE_FILE, sep="\t", low_memory=False)
-cause_decade = cause[cause["decade"] == DECADE].copy()
-
-# Exclude aggregate rows
+# Load mortality data (for official totals and population)
+print(f"  Loading mortality data for validation...")
+mort_decade = cached_table(f"{MORTALITY_FILE.stem}_{DECADE}", [MORTALITY_FILE], lambda: (
+    read_decade(MORTALITY_FILE, MORT_COLS, dtype=MORT_DTYPES)
+    .assign(reg_dist_norm=lambda t: normalize_district(t["reg_dist"]))
+))
+
+# Official total deaths from the first mortality row per RD
+def official_group_totals(mort, district_dtype):
+    """Official deaths per (district_norm, sex, age_group), from the first mortality row per RD."""
+    mort_first = (
+        mort.dropna(subset=['reg_dist_norm'])
+        .drop_duplicates('reg_dist_norm')
+        .set_index('reg_dist_norm')
+    )
+    mort_first = mort_first[[c for c in MORT_COL_GROUPS if c in mort_first.columns]]
+    mort_first = mort_first.apply(pd.to_numeric, errors='coerce')  # placeholders like "." → NaN
+    mort_first.index = mort_first.index.astype(district_dtype)
+    mort_sexes, mort_ages = zip(*[MORT_COL_GROUPS[c] for c in mort_first.columns])
+    mort_first.columns = pd.MultiIndex.from_arrays(
+        [pd.Categorical(mort_sexes, dtype=df['sex'].dtype),
+         pd.Categorical(mort_ages, dtype=df['age_group'].dtype)],
+        names=['sex', 'age_group']
+    )
+    totals = mort_first.stack(['sex', 'age_group'], future_stack=True)
+    totals.index.names = GROUP_COLS
+    return totals
+
+# Aggregate rows of the cause table, not causes of death
 EXCLUDE = ["Mean Population", "Total Deaths", "All Causes", "Total Births"]
-cause_decade = cause_decade[~cause_decade["cause"].isin(EXCLUDE)].copy()
-print(f"  {len(cause_decade):,} cause records loaded")
 
-# Normalize district names
-cause_decade["reg_dist_norm"] = cause_decade["reg_dist"].apply(normalize_district)
+def cause_probabilities(mort):
+    """
+    P(cause | RD, sex, age_group) for every group in this decade's cause table, in long form.
+    Uses the official total if available, otherwise the sum over causes; groups with no
+    deaths are dropped.
+    """
+    cause_decade = read_decade(CAUSE_FILE, CAUSE_COLS, dtype=CAUSE_DTYPES, exclude_causes=EXCLUDE)
+    print(f"  {len(cause_decade):,} cause records loaded")
+    cause_decade["reg_dist_norm"] = normalize_district(cause_decade["reg_dist"])
+    decade_districts = pd.CategoricalDtype(
+        pd.Index(cause_decade["reg_dist_norm"].dropna().unique())
+        .union(mort["reg_dist_norm"].dropna().unique())
+    )
+    cause_decade["reg_dist_norm"] = cause_decade["reg_dist_norm"].astype(decade_districts)
+    cause_decade["sex"] = as_category(cause_decade["sex"], df["sex"].dtype)
+
+    # Deaths by cause as numbers while the table is still wide (one column per age bin),
+    # then in long form: one row per (RD, sex, age_group, cause)
+    age_cols = [c for c in AGE_GROUPS if c in cause_decade.columns]
+    cause_decade[age_cols] = cause_decade[age_cols].apply(pd.to_numeric, errors='coerce').fillna(0)
+    dist = cause_decade.melt(
+        id_vars=['reg_dist_norm', 'sex', 'cause'], value_vars=age_cols,
+        var_name='age_group', value_name='deaths'
+    ).rename(columns={'reg_dist_norm': 'district_norm'})
+    dist['age_group'] = dist['age_group'].astype(df['age_group'].dtype)
+    dist_index = pd.MultiIndex.from_frame(dist[GROUP_COLS])
+
+    # Every probability comes from one vector divide (rows with an NA key get no total)
+    cause_sums = dist.groupby(GROUP_COLS, sort=False, observed=True)['deaths'].sum()
+    total_official = official_group_totals(mort, decade_districts).reindex(cause_sums.index)
+    total = total_official.where(total_official > 0, cause_sums)
+    dist_total = total.reindex(dist_index).to_numpy()
+    dist['probability'] = (dist['deaths'] / dist_total).round(4)
+    return dist.loc[dist_total > 0, GROUP_COLS + ['cause', 'probability']].reset_index(drop=True)
+
+# Cause probabilities depend only on the decade, so they are cached once per decade
+# and reused by every year in it
+cause_probs = cached_table(
+    f"cause_probabilities_{DECADE}", [CAUSE_FILE, MORTALITY_FILE],
+    lambda: cause_probabilities(mort_decade)
+)
 
-# Load mortality data (for official totals and population)
-print(f"  Loading mortality data for validation...")
-mort = pd.read_csv(MORTALITY_FILE, sep="\t", low_memory=False)
-mort_decade = mort[mort["decade"] == DECADE].copy()
-mort_decade["reg_dist_norm"] = mort_decade["reg_dist"].apply(normalize_district)
+# Shared categorical dtypes for the join keys, so death groups, cause rows and
+# mortality rows are matched on integer codes rather than by hashing strings
+district_dtype = pd.CategoricalDtype(
+    df["district_norm"].cat.categories
+    .union(cause_probs["district_norm"].dropna().unique())
+    .union(mort_decade["reg_dist_norm"].dropna().unique())
+)
+df["district_norm"] = df["district_norm"].cat.set_categories(district_dtype.categories)
+cause_probs = cause_probs.astype({
+    "district_norm": district_dtype, "sex": df["sex"].dtype, "age_group": df["age_group"].dtype
+})
 
 # OPTIMIZATION: Pre-compute cause distributions for unique (RD, sex, age_group) combinations
 # This is 10-50× faster than row-by-row iteration
@@ -221,154 +428,124 @@ mort_decade["reg_dist_norm"] = mort_decade["reg_dist"].apply(normalize_district)
 print(f"  Building cause distribution lookup...")
 
 # Get unique groups in death data
-unique_groups = df[['district_norm', 'sex', 'age_group']].drop_duplicates()
+unique_groups = df[GROUP_COLS].drop_duplicates()
 print(f"    {len(unique_groups):,} unique (RD, sex, age) groups")
 
-# Build lookup: group_key → cause_distribution_json + total_deaths
-cause_lookup = {}
-total_deaths_lookup = {}
-
-for _, row in unique_groups.iterrows():
-    rd_norm = row['district_norm']
-    sex = row['sex']
-    age_group = row['age_group']
-
-    # Skip if any field is missing
-    if pd.isna(rd_norm) or pd.isna(sex) or pd.isna(age_group):
-        continue
-
-    # Create key
-    key = f"{rd_norm}|{sex}|{age_group}"
-
-    # Get official total deaths from mortality file
-    # Column naming: m_35_44 for males, f_35_44 for females
-    sex_prefix = sex.lower() if sex in ['M', 'F'] else None
-    if sex_prefix:
-        mort_col = f"{sex_prefix.lower()}_{age_group.replace('a_', '')}"
-        mort_row = mort_decade[mort_decade["reg_dist_norm"] == rd_norm]
-
-        if len(mort_row) > 0 and mort_col in mort_row.columns:
-            total_official = mort_row.iloc[0][mort_col]
-            total_deaths_lookup[key] = total_official
-        else:
-            total_official = None
-    else:
-        total_official = None
-
-    # Get cause distribution for this group
-    subset = cause_decade[
-        (cause_decade["reg_dist_norm"] == rd_norm) &
-        (cause_decade["sex"] == sex)
-    ]
-
-    if len(subset) == 0 or age_group not in subset.columns:
-        cause_lookup[key] = None
-        continue
-
-    # Extract deaths by cause for this age group
-    dist = subset[["cause", age_group]].copy()
-    dist = dist.rename(columns={age_group: "deaths"})
-    dist["deaths"] = pd.to_numeric(dist["deaths"], errors="coerce").fillna(0)
-
-    # Use official total if available, otherwise sum causes
-    if total_official and total_official > 0:
-        total = total_official
-    else:
-        total = dist["deaths"].sum()
-
-    # Compute probabilities
-    if total > 0:
-        dist["probability"] = dist["deaths"] / total
-
-        # Convert to dictionary and then JSON
-        cause_dict = dict(zip(dist["cause"], dist["probability"].round(4)))
-        cause_lookup[key] = json.dumps(cause_dict, ensure_ascii=False)
-    else:
-        cause_lookup[key] = None
-
-print(f"    Computed distributions for {len(cause_lookup):,} groups")
+# Build lookup: group_key → cause distribution dict + total_deaths
+# (dicts are serialized to JSON once per group, not once per death)
+groups = unique_groups.dropna()
+group_index = pd.MultiIndex.from_frame(groups)
+# Official totals (NaN where the RD has no mortality row)
+total_official = official_group_totals(mort_decade, district_dtype).reindex(group_index)
+dist = cause_probs[pd.MultiIndex.from_frame(cause_probs[GROUP_COLS]).isin(group_index)]
+
+# One groupby pass gives each group's row positions; slice plain arrays with them
+# instead of materializing a sub-DataFrame per group
+causes = dist['cause'].to_numpy(dtype=object)
+probabilities = dist['probability'].to_numpy()
+cause_dicts = {
+    key: dict(zip(causes[rows], probabilities[rows].tolist()))
+    for key, rows in dist.groupby(GROUP_COLS, sort=False, observed=True).indices.items()
+}
+
+# One lookup table per group: JSON distribution (None if no cause rows or no deaths)
+# and the official total
+group_lookup = pd.DataFrame({
+    'cause_distribution': pd.Series(
+        [json_dumps(cause_dicts[key]) if key in cause_dicts else None for key in group_index],
+        index=group_index, dtype=object
+    ),
+    'total_deaths_in_group': total_official,
+})
+
+print(f"    Computed distributions for {len(group_lookup):,} groups")
 
 # VECTORIZED MAPPING: Use pandas map instead of row-by-row iteration
 print(f"  Mapping to {n_records:,} deaths...")
 
-# Create temporary key column
-df['_key'] = (
-    df['district_norm'].fillna('') + '|' +
-    df['sex'].fillna('') + '|' +
-    df['age_group'].fillna('')
-)
-
-# Map cause distributions and total deaths
-df['cause_distribution'] = df['_key'].map(cause_lookup)
-df['total_deaths_in_group'] = df['_key'].map(total_deaths_lookup)
-
-# Clean up
-df = df.drop(columns=['_key'])
+# Look up cause distributions and total deaths by (RD, sex, age_group): one
+# MultiIndex reindex fetches both columns (rows with a missing key get NaN)
+death_groups = pd.MultiIndex.from_frame(df[GROUP_COLS])
+matched = group_lookup.reindex(death_groups)
+df['cause_distribution'] = matched['cause_distribution'].to_numpy()
+df['total_deaths_in_group'] = matched['total_deaths_in_group'].to_numpy()
 
 # Load RD boundary stability from harmonization
 # This tells us which RDs had changing boundaries over time
-coverage_full = pd.read_csv(COVERAGE_FILE)
-census_years = [1851, 1861, 1871, 1881, 1891, 1901, 1911]
-coverage_census = coverage_full[coverage_full['year'].isin(census_years)].copy()
-
-stability = coverage_census.groupby('district').agg({
-    'matched_share': 'std'
-}).round(3)
-stability.columns = ['boundary_change_std']
-stability['boundary_stability'] = 'stable'
-stability.loc[stability['boundary_change_std'] > 0.2, 'boundary_stability'] = 'unstable'
-stability.loc[stability['boundary_change_std'] > 0.3, 'boundary_stability'] = 'very_unstable'
-stability = stability.reset_index()
-
-# Merge stability to deaths
-df = df.merge(stability[['district', 'boundary_stability', 'boundary_change_std']],
-              left_on='rd_name', right_on='district', how='left', suffixes=('', '_stab'))
-df = df.drop(columns=['district_stab'], errors='ignore')
+# (computed from the coverage table already loaded in Stage 1)
+cov_census = cov[cov['year'].isin(CENSUS_YEARS)]
+change_std = cov_census.groupby('district', sort=False)['matched_share'].std().round(3)
+# std > 0.2 → unstable, > 0.3 → very_unstable; single-census RDs (no std) count as stable
+stability = pd.cut(
+    change_std, bins=[-np.inf, 0.2, 0.3, np.inf],
+    labels=['stable', 'unstable', 'very_unstable']
+).fillna('stable')
+
+# Map stability to deaths by RD name
+df['boundary_stability'] = df['rd_name'].map(stability).astype(stability.dtype)
+df['boundary_change_std'] = df['rd_name'].map(change_std)
 
 # Add spatial quality flag based on matched_share
-df['spatial_quality'] = 'missing'
-df.loc[df['matched_share'] >= 0.8, 'spatial_quality'] = 'high'
-df.loc[(df['matched_share'] >= 0.5) & (df['matched_share'] < 0.8), 'spatial_quality'] = 'medium'
-df.loc[(df['matched_share'] < 0.5) & (df['matched_share'].notna()), 'spatial_quality'] = 'low'
+matched_share = df['matched_share'].to_numpy()
+df['spatial_quality'] = np.select(
+    [matched_share >= 0.8, matched_share >= 0.5, ~np.isnan(matched_share)],
+    ['high', 'medium', 'low'],
+    default='missing'
+)
 
-# Combined spatial confidence (set in order: low -> medium -> high to avoid overwriting)
-df['spatial_confidence'] = 'low'
-df.loc[(df['matched_share'] >= 0.5) & (df['boundary_stability'].isin(['stable', 'unstable'])), 'spatial_confidence'] = 'medium'
-df.loc[(df['matched_share'] >= 0.8) & (df['boundary_stability'] == 'stable'), 'spatial_confidence'] = 'high'
+# Combined spatial confidence (first matching condition wins: high -> medium -> low)
+stability_flag = df['boundary_stability']
+df['spatial_confidence'] = np.select(
+    [(matched_share >= 0.8) & (stability_flag == 'stable').to_numpy(),
+     (matched_share >= 0.5) & stability_flag.isin(['stable', 'unstable']).to_numpy()],
+    ['high', 'medium'],
+    default='low'
+)
 
 # Flag deaths with uncertain cause probabilities due to RD boundary mismatch
 # Problem: Cause stats use time-varying RD boundaries, deaths mapped to fixed 1851 backbone
 # Uncertain if: (1) unstable boundaries OR (2) matched_share = 0 (never matched to 1851 parishes)
-df['cause_uncertain'] = False
-df.loc[df['boundary_stability'].isin(['unstable', 'very_unstable']), 'cause_uncertain'] = True
-df.loc[df['matched_share'] == 0.0, 'cause_uncertain'] = True  # Never matched to parishes
+df['cause_uncertain'] = (
+    stability_flag.isin(['unstable', 'very_unstable']).to_numpy()
+    | (matched_share == 0.0)  # Never matched to parishes
+)
 
 # Create adjusted cause distribution weighted by matched_share
 # For low matched_share, add "uncertain_boundary" category to reflect spatial uncertainty
-def adjust_cause_distribution(row):
-    """Adjust cause probabilities based on matched_share to account for boundary uncertainty."""
-    if pd.isna(row['cause_distribution']) or pd.isna(row['matched_share']):
-        return row['cause_distribution']
-
-    if row['matched_share'] >= 0.8:
-        # High confidence - use original distribution
-        return row['cause_distribution']
-
-    # Low/medium confidence - scale probabilities and add uncertainty
-    try:
-        causes = json.loads(row['cause_distribution'])
-        matched = row['matched_share']
-
-        # Scale down all cause probabilities by matched_share
-        adjusted = {cause: round(prob * matched, 4) for cause, prob in causes.items()}
-        # Add uncertainty category for unmatched portion
-        adjusted['uncertain_boundary_mismatch'] = round(1 - matched, 4)
-
-        return json.dumps(adjusted, ensure_ascii=False)
-    except:
-        return row['cause_distribution']
-
-df['cause_distribution_adjusted'] = df.apply(adjust_cause_distribution, axis=1)
+def adjust_cause_distribution(causes, matched):
+    """Scale cause probabilities by matched_share and add the unmatched portion."""
+    # Scale down all cause probabilities by matched_share
+    adjusted = {cause: round(prob * matched, 4) for cause, prob in causes.items()}
+    # Add uncertainty category for unmatched portion
+    adjusted['uncertain_boundary_mismatch'] = round(1 - matched, 4)
+
+    return json_dumps(adjusted)
+
+# High confidence (matched_share >= 0.8) and missing values keep the original distribution.
+# Low-confidence distributions are built once per (group, matched_share), not per death.
+df['cause_distribution_adjusted'] = df['cause_distribution']
+low_conf = (df['matched_share'] < 0.8) & df['cause_distribution'].notna()
+low_pairs = df.loc[low_conf, GROUP_COLS + ['matched_share']]
+adjusted_lookup = {
+    (rd_norm, sex, age_group, matched):
+        adjust_cause_distribution(cause_dicts[rd_norm, sex, age_group], matched)
+    for rd_norm, sex, age_group, matched in low_pairs.drop_duplicates().itertuples(index=False)
+}
+df.loc[low_conf, 'cause_distribution_adjusted'] = pd.MultiIndex.from_frame(low_pairs).map(adjusted_lookup)
+
+# Explicit decade column for transparency (one constant, so a 2-byte int column)
+df['decade'] = np.int16(DECADE)
+
+# Narrow the output types where no precision is lost: death counts and 3-decimal stds
+# fit float32, yod/qod fit small ints. Ages (may be fractions like 1/12), matched_share
+# and centroids keep float64.
+for col in ['total_deaths_in_group', 'boundary_change_std']:
+    df[col] = df[col].astype('float32')
+for col in ['yod', 'qod']:
+    if col in df.columns:
+        df[col] = pd.to_numeric(df[col], downcast='integer')
+for col in ['spatial_quality', 'spatial_confidence']:
+    df[col] = df[col].astype('category')
 
 # Reorder columns: put spatial/geographic data at the end for readability
 core_cols = [
@@ -392,10 +569,56 @@ df = df[core_cols + spatial_cols]
 n_assigned = df['cause_distribution'].notna().sum()
 print(f"  Assigned: {n_assigned:,} / {n_records:,} ({n_assigned/n_records*100:.1f}%)")
 
-# Save Stage 2: with causes
-out2 = OUT_DIR / f"deaths_{YEAR}_with_causes.csv"
-df.to_csv(out2, index=False)
-print(f"  ✓ Saved: {out2.name}")
+# Save Stage 2: with causes. Parquet (columnar, compressed, much faster to write and
+# load than CSV), plus the CSV when WRITE_CSV is set or Parquet is unavailable.
+# In the Parquet file the distributions are lists of (cause, probability) structs;
+# the CSV keeps them as JSON strings.
+out_csv = OUT_DIR / f"deaths_{YEAR}_with_causes.csv"
+out_parquet = out_csv.with_suffix(".parquet")
+out2 = out_parquet
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    dist_entries = {
+        col: distribution_entries(df[col])
+        for col in ['cause_distribution', 'cause_distribution_adjusted']
+    }
+
+    # One schema from the whole frame, so a chunk where a column happens to be all-null
+    # is not inferred as a different type
+    flat_schema = pa.Schema.from_pandas(df.drop(columns=list(dist_entries)), preserve_index=False)
+    schema = flat_schema
+    for col, (_, entries) in dist_entries.items():
+        schema = schema.insert(df.columns.get_loc(col), pa.field(col, entries.type))
+
+    def parquet_rows(start, stop):
+        """Arrow table for df rows start:stop, distributions expanded from their entries."""
+        table = pa.Table.from_pandas(
+            df.iloc[start:stop].drop(columns=list(dist_entries)),
+            schema=flat_schema, preserve_index=False
+        )
+        for col, (codes, entries) in dist_entries.items():
+            rows = codes[start:stop]
+            table = table.add_column(
+                df.columns.get_loc(col), col, entries.take(pa.array(rows, mask=rows < 0))
+            )
+        return table
+
+    # Stream one row group at a time, so only one chunk's Arrow copy is held in memory
+    row_group_size = 200_000
+    with pq.ParquetWriter(out_parquet, schema, compression="zstd") as writer:
+        for start in range(0, len(df), row_group_size):
+            writer.write_table(parquet_rows(start, start + row_group_size))
+    print(f"  ✓ Saved: {out_parquet.name}")
+except ImportError:
+    print("  (pyarrow not installed - skipped Parquet copy)")
+    out2 = out_csv
+
+if WRITE_CSV or out2 == out_csv:
+    df.to_csv(out_csv, index=False)
+    print(f"  ✓ Saved: {out_csv.name}")
+    out2 = out_csv
 
 # ══════════════════════════════════════════════════════════════════════════════
 # SUMMARY
@@ -415,7 +638,7 @@ if 'cause_uncertain' in df.columns:
     print(f"Uncertain:      {n_uncertain:,} ({n_uncertain/n_records*100:.1f}%)")
 print(f"\nOutput:")
 print(f"  {out2}")
-print(f"\nFormat: JSON cause distribution")
+print(f"\nFormat: cause distribution as list of (cause, probability) in Parquet, JSON in CSV")
 print(f"  Example: {{'Tuberculosis': 0.425, 'Pneumonia': 0.21, ...}}")
 
 # ══════════════════════════════════════════════════════════════════════════════
@@ -427,25 +650,25 @@ if RUN_SENSITIVITY and 'cause_uncertain' in df.columns:
     print("SENSITIVITY ANALYSIS: Certain vs All Deaths")
     print("="*70)
 
-    # Split by uncertainty
-    certain = df[df['cause_uncertain'] == False]
-    uncertain = df[df['cause_uncertain'] == True]
-
-    print(f"\nData split:")
-    print(f"  Certain:   {len(certain):6,} ({len(certain)/len(df)*100:5.1f}%)")
-    print(f"  Uncertain: {len(uncertain):6,} ({len(uncertain)/len(df)*100:5.1f}%)")
-
-    # Get top causes
+    # Get top causes (each distinct distribution is parsed once; deaths in a group share it)
     def get_top_cause(json_str):
         if pd.isna(json_str): return None
         try:
-            causes = json.loads(json_str)
+            causes = json_loads(json_str)
             return max(causes.items(), key=lambda x: x[1])[0]
         except:
             return None
 
-    df['top_cause'] = df['cause_distribution'].apply(get_top_cause)
-    certain['top_cause'] = certain['cause_distribution'].apply(get_top_cause)
+    top_cause = {js: get_top_cause(js) for js in df['cause_distribution'].dropna().unique()}
+    df['top_cause'] = df['cause_distribution'].map(top_cause)
+
+    # Split by uncertainty
+    certain = df[df['cause_uncertain'] == False]
+    uncertain = df[df['cause_uncertain'] == True]
+
+    print(f"\nData split:")
+    print(f"  Certain:   {len(certain):6,} ({len(certain)/len(df)*100:5.1f}%)")
+    print(f"  Uncertain: {len(uncertain):6,} ({len(uncertain)/len(df)*100:5.1f}%)")
 
     print("\n" + "-"*70)
     print("Top 10 causes - All deaths:")